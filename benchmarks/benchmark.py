@@ -0,0 +1,209 @@
+"""Headless benchmarks of generation and export.
+
+Every case (shape, resolution and dtype) runs in a fresh Python process,
+so its peak RSS is not inflated by earlier cases, and calls
+``GyroidGenerator.generate``, ``save_stl`` and ``save_obj`` directly. Nothing
+from Qt is imported. For each stage (the generate call and its grid, field,
+mask and contour stages, and both exports) the best wall time over the
+repeats and the process's peak RSS after the stage are recorded, together
+with the mesh's triangle count.
+
+Results are written as JSON. Comparing them with an earlier run flags every
+stage that got slower or used more memory than the thresholds allow, and
+any change in triangle count, and exits non-zero if there are any::
+
+    python benchmarks/benchmark.py -o baseline.json
+    python benchmarks/benchmark.py -o current.json --compare baseline.json
+    python benchmarks/benchmark.py --shape diamond --res 50 100 --dtype float32 --repeat 5
+
+Timings are only comparable between runs on the same machine.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+GYGUI = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'gygui')
+sys.path.insert(0, GYGUI)
+
+SHAPES = ['radial', 'cartesian', 'diamond']
+RESOLUTIONS = [50, 100, 200, 400]
+DTYPES = ['float32', 'float64']
+REPEAT = 3
+# Default regression thresholds: the relative slow-down and peak RSS growth
+# tolerated, the slow-down in seconds below which a stage is never flagged,
+# and the relative change in triangle count tolerated.
+THRESHOLDS = {'time': 0.25, 'min_seconds': 0.05, 'rss': 0.15, 'triangles': 0.0}
+RESULTS_VERSION = 1
+
+
+def case_key(case):
+    return case['shape'], case['res'], case['dtype']
+
+
+def stage_name(event):
+    # Exports are told apart by the file they write
+    if event['stage'] == 'export':
+        return 'save_' + os.path.splitext(event['path'])[1][1:]
+    return event['stage']
+
+
+def run_case(shape, res, dtype, repeat=REPEAT, obj=True):
+    """Run one case in this process; returns its result record."""
+    from gyroid_generator import GyroidGenerator
+    from instrument import EventLog, hooked
+    from parameters import complete_params
+
+    generator = GyroidGenerator()
+    params = complete_params({'shape': shape, 'res': res, 'dtype': dtype})
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeat):
+            log = EventLog()
+            with hooked(log):
+                mesh = generator.generate(params)
+                generator.save_stl(mesh, os.path.join(directory, 'mesh.stl'))
+                if obj:
+                    generator.save_obj(mesh, os.path.join(directory, 'mesh.obj'))
+            triangles = mesh.n_cells
+            del mesh
+            for event in log.events:
+                name = stage_name(event)
+                best = stages.get(name, {'seconds': float('inf')})
+                stages[name] = {'seconds': min(best['seconds'], event['seconds']), 'max_rss': event['max_rss']}
+    return {'shape': shape, 'res': res, 'dtype': dtype, 'repeat': repeat, 'triangles': triangles,
+            'stages': stages}
+
+
+def run_isolated(shape, res, dtype, repeat=REPEAT, obj=True):
+    """Run one case in a child process and return its record."""
+    command = [sys.executable, os.path.abspath(__file__), 'case', shape, str(res), dtype, '--repeat', str(repeat)]
+    if not obj:
+        command.append('--no-obj')
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode:
+        return {'shape': shape, 'res': res, 'dtype': dtype, 'error': result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout)
+
+
+def environment():
+    """Versions and machine details stored with the results."""
+    import numpy
+    import pyvista
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=GYGUI).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'numpy': numpy.__version__, 'pyvista': pyvista.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'system': platform.platform(),
+            'cpus': os.cpu_count(), 'commit': commit}
+
+
+def run_suite(shapes=SHAPES, resolutions=RESOLUTIONS, dtypes=DTYPES, repeat=REPEAT, obj=True, report=print):
+    """Run every combination of the given shapes, resolutions and dtypes."""
+    cases = []
+    for shape, res, dtype in itertools.product(shapes, resolutions, dtypes):
+        case = run_isolated(shape, res, dtype, repeat, obj)
+        report(format_case(case))
+        cases.append(case)
+    return {'version': RESULTS_VERSION, 'environment': environment(), 'cases': cases}
+
+
+def format_case(case):
+    name = f"{case['shape']:<10} res {case['res']:<4} {case['dtype']:<8}"
+    if 'error' in case:
+        return f"{name} error: {' '.join(case['error'])}"
+    stages = ', '.join(f"{k} {v['seconds']:.3f}s" for k, v in case['stages'].items())
+    peak = max(v['max_rss'] or 0 for v in case['stages'].values())
+    return f"{name} {case['triangles']:>9} triangles, peak RSS {peak / 2 ** 20:.0f} MB: {stages}"
+
+
+def compare(results, baseline, thresholds=THRESHOLDS):
+    """List the regressions of ``results`` against ``baseline``.
+
+    Cases and stages missing from either run are skipped. Returns a list of
+    human-readable descriptions, empty if there are none.
+    """
+    previous = {case_key(case): case for case in baseline['cases'] if 'error' not in case}
+    regressions = []
+    for case in results['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        name = '{} res {} {}'.format(*case_key(case))
+        if 'error' in case:
+            regressions.append(f"{name}: failed ({' '.join(case['error'])})")
+            continue
+        if abs(case['triangles'] - old['triangles']) > thresholds['triangles'] * old['triangles']:
+            regressions.append(f"{name}: {old['triangles']} -> {case['triangles']} triangles")
+        for stage, new in case['stages'].items():
+            if stage not in old['stages']:
+                continue
+            before = old['stages'][stage]
+            slower = new['seconds'] - before['seconds']
+            if slower > thresholds['min_seconds'] and slower > thresholds['time'] * before['seconds']:
+                regressions.append(f"{name} {stage}: {before['seconds']:.3f}s -> {new['seconds']:.3f}s")
+            if new['max_rss'] and before['max_rss'] and new['max_rss'] > (1 + thresholds['rss']) * before['max_rss']:
+                regressions.append(f"{name} {stage}: peak RSS {before['max_rss'] / 2 ** 20:.0f} MB -> "
+                                   f"{new['max_rss'] / 2 ** 20:.0f} MB")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark mesh generation and export.")
+    parser.add_argument('-o', '--output', default=None, help="JSON file for the results.")
+    parser.add_argument('--compare', default=None, help="Results of an earlier run to check for regressions.")
+    parser.add_argument('--shape', nargs='+', default=SHAPES)
+    parser.add_argument('--res', nargs='+', type=int, default=RESOLUTIONS)
+    parser.add_argument('--dtype', nargs='+', choices=DTYPES, default=DTYPES)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="Runs per case; the fastest is kept.")
+    parser.add_argument('--no-obj', dest='obj', action='store_false', help="Skip the OBJ export.")
+    parser.add_argument('--time-threshold', dest='time', type=float, default=THRESHOLDS['time'],
+                        help="Relative slow-down of a stage flagged as a regression.")
+    parser.add_argument('--min-seconds', dest='min_seconds', type=float, default=THRESHOLDS['min_seconds'],
+                        help="Slow-downs smaller than this are never flagged.")
+    parser.add_argument('--rss-threshold', dest='rss', type=float, default=THRESHOLDS['rss'],
+                        help="Relative peak RSS growth flagged as a regression.")
+    parser.add_argument('--triangle-threshold', dest='triangles', type=float, default=THRESHOLDS['triangles'],
+                        help="Relative change in triangle count flagged as a regression.")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['case']:
+        # Child process of run_isolated
+        case = argparse.ArgumentParser()
+        case.add_argument('shape')
+        case.add_argument('res', type=int)
+        case.add_argument('dtype')
+        case.add_argument('--repeat', type=int, default=REPEAT)
+        case.add_argument('--no-obj', dest='obj', action='store_false')
+        args = case.parse_args(argv[1:])
+        print(json.dumps(run_case(args.shape, args.res, args.dtype, args.repeat, args.obj)))
+        return 0
+
+    args = build_parser().parse_args(argv)
+    results = run_suite(args.shape, args.res, args.dtype, args.repeat, args.obj)
+    results['thresholds'] = {key: getattr(args, key) for key in THRESHOLDS}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    failed = any('error' in case for case in results['cases'])
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), results['thresholds'])
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.compare}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
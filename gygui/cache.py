@@ -0,0 +1,202 @@
+"""Content-addressed caching of generated meshes.
+
+Results are keyed on a hash of the canonical generation parameters, so
+revisiting a parameter set returns the stored result instead of
+recomputing it. A byte-budgeted in-memory tier holds live objects; an
+optional on-disk tier keeps meshes as compressed NumPy archives.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyvista as pv
+
+from meshing import triangles
+
+# Bump when generator changes would alter results, to invalidate disk entries.
+CACHE_VERSION = 1
+
+
+def params_key(kind, params, *args):
+    """Hash ``params`` canonically: key order and int/float spelling of the
+    same number do not change the key."""
+    def canonical(value):
+        if isinstance(value, (bool, str)) or value is None:
+            return value
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return float(value)
+        if isinstance(value, dict):
+            return {str(k): canonical(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [canonical(v) for v in value]
+        return repr(value)
+
+    text = json.dumps([CACHE_VERSION, kind, canonical(params), canonical(args)], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def nbytes(value):
+    """Approximate memory held by a cached field or mesh."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return value.actual_memory_size * 1024
+
+
+class MemoryCache:
+    """In-memory cache bounded by total bytes and, optionally, entry count.
+
+    ``policy`` selects which entry is evicted when over budget: ``'lru'``
+    evicts the least recently used entry, ``'lfu'`` the least frequently
+    used one (ties broken by recency). It is safe to share between
+    threads, e.g. GUI generation jobs that overlap after a cancel.
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20, max_entries=None, policy='lru'):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            value, size, hits = self._entries.pop(key)
+            self._entries[key] = (value, size, hits + 1)
+            return value
+
+    def put(self, key, value):
+        size = nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, 1)
+            self.size += size
+            while self.size > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+                self._evict(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _evict(self, keep):
+        # Called with the lock held. The entry just stored, ``keep``, is
+        # never the victim: under LFU its single hit would otherwise always
+        # lose to older entries, and nothing new would stay cached.
+        others = (k for k in self._entries if k != keep)
+        if self.policy == 'lfu':
+            key = min(others, key=lambda k: self._entries[k][2])
+        else:
+            key = next(others)
+        self.size -= self._entries.pop(key)[1]
+
+
+class DiskCache:
+    """On-disk mesh cache of compressed ``.npz`` files in ``directory``.
+
+    Reading an entry refreshes its modification time; when the directory
+    exceeds ``max_bytes`` the least recently used files are removed.
+    """
+
+    def __init__(self, directory, max_bytes=4 * 2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            mesh = pv.PolyData.from_regular_faces(data['points'], data['faces'])
+        os.utime(path)
+        return mesh
+
+    def put(self, key, mesh):
+        path = self._path(key)
+        # Write to a temporary name first so readers never see partial files.
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(tmp, points=np.asarray(mesh.points), faces=np.asarray(triangles(mesh)))
+        os.replace(tmp, path)
+        self._trim()
+
+    def _trim(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and '.tmp.' not in name:
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+# Generator methods whose result depends only on their arguments, keyed on
+# all of them. ``generate_preview`` takes live trig tables and is not cached.
+CACHED_METHODS = ('generate_parallel', 'generate_periodic', 'generate_sparse')
+
+
+class CachedGenerator:
+    """Wraps a GyroidGenerator and serves repeated requests from the cache.
+
+    Methods other than the cached ones are forwarded to the wrapped
+    generator unchanged. ``last_hit`` tells whether the latest mesh came
+    from the cache.
+    """
+
+    def __init__(self, generator, memory=None, disk=None):
+        self.generator = generator
+        self.memory = memory if memory is not None else MemoryCache()
+        self.disk = disk
+        self.last_hit = False
+
+    def __getattr__(self, name):
+        method = getattr(self.generator, name)
+        if name not in CACHED_METHODS:
+            return method
+        return lambda params, *args: self._mesh(name, params, lambda: method(params, *args), *args)
+
+    def generate(self, params):
+        return self._mesh('generate', params, lambda: self.generator.generate(params))
+
+    def generate_streaming(self, params, slab_size=None, progress=None):
+        return self._mesh('generate_streaming', params,
+                          lambda: self.generator.generate_streaming(params, slab_size, progress), slab_size)
+
+    def _mesh(self, kind, params, compute, *args):
+        key = params_key(kind, params, *args)
+        mesh = self.memory.get(key)
+        if mesh is None and self.disk is not None:
+            mesh = self.disk.get(key)
+            if mesh is not None:
+                self.memory.put(key, mesh)
+        self.last_hit = mesh is not None
+        if mesh is None:
+            mesh = compute()
+            self.memory.put(key, mesh)
+            if self.disk is not None:
+                self.disk.put(key, mesh)
+        # Callers may attach arrays to the mesh; keep the cached copy clean.
+        return mesh.copy(deep=False)
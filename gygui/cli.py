@@ -0,0 +1,263 @@
+"""Headless command-line entry point for generating and exporting meshes.
+
+Nothing from Qt is imported, and the generator itself is only imported once
+a command runs, so ``--help`` and argument errors return immediately and no
+display server is needed.
+
+Examples::
+
+    python cli.py generate --shape diamond --res 120 --density 2 -o diamond.stl
+    python cli.py sweep sweep.json --out-dir results --workers 8
+    python cli.py metrics --sweep sweep.json --res 48 -o metrics.json
+    python cli.py generate --shape diamond --res 200 -o diamond.stl --events - --trace-memory
+    python cli.py sweep sweep.json --out-dir results --cache-dir ~/.cache/gygui
+
+A sweep file is JSON: either a list of parameter sets, or an object with an
+optional ``"base"`` parameter set and a ``"grid"`` mapping each parameter to
+a list of values, which expands to every combination. Entries may set a
+``"name"`` used for the output file.
+
+With ``--events`` every finished stage (grid, field, mask, contour,
+postprocess, export) is appended to a file, or ``-`` for stdout, as one JSON
+object per line; see ``instrument.py`` for the fields.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from field import MODES
+from instrument import EventLog, JsonLinesHook, hooked
+from parameters import DEFAULT_PARAMS, complete_params, shape_names
+from postprocess import parse_steps
+
+METHODS = ['generate', 'streaming', 'parallel', 'periodic', 'sparse']
+DTYPES = ['float32', 'float64']
+POST_HELP = ("Post-processing steps to run before export, e.g. "
+             "'weld,clean,smooth:iterations=10,decimate:target=0.5'.")
+CACHE_HELP = ("Directory of an on-disk mesh cache: parameter sets generated before are loaded from it "
+              "instead of recomputed.")
+
+
+def load_sweep(path):
+    """Read a sweep file and return its list of parameter sets."""
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        return spec
+    base = spec.get('base', {})
+    grid = spec.get('grid', {})
+    keys = list(grid)
+    return [dict(base, **dict(zip(keys, values)))
+            for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _hooks(events, log, **extra):
+    # The stage hooks of one job: its log, plus JSON lines if requested
+    return (log, JsonLinesHook(events, **extra)) if events else (log,)
+
+
+def run_job(params, filename, method='generate', post=None, events=None, cache_dir=None):
+    """Generate, optionally post-process, and export one mesh; returns a
+    manifest record with timings. Stage events are written as JSON lines
+    to ``events`` if given. With ``cache_dir``, meshes are read from and
+    stored in an on-disk cache there, before post-processing."""
+    record = {'params': params, 'path': filename, 'method': method}
+    log = EventLog()
+    with hooked(*_hooks(events, log, job=filename)):
+        _run_job(record, params, filename, method, post, cache_dir)
+    record['stages'] = log.totals()
+    record['max_rss'] = log.peak_rss()
+    return record
+
+
+def _run_job(record, params, filename, method, post, cache_dir):
+    try:
+        from gyroid_generator import GyroidGenerator
+        generator = GyroidGenerator()
+        if cache_dir is not None:
+            from cache import CachedGenerator, DiskCache
+            generator = CachedGenerator(generator, disk=DiskCache(cache_dir))
+        params = complete_params(params)
+
+        start = time.perf_counter()
+        if method == 'generate':
+            mesh = generator.generate(params)
+        else:
+            mesh = getattr(generator, f'generate_{method}')(params)
+        record['generate_s'] = time.perf_counter() - start
+        if cache_dir is not None:
+            record['cache'] = 'hit' if generator.last_hit else 'miss'
+
+        if post:
+            mesh, record['postprocess'] = generator.postprocess(mesh, post)
+
+        start = time.perf_counter()
+        if filename.lower().endswith('.obj'):
+            generator.save_obj(mesh, filename)
+        elif filename.lower().endswith('.ply'):
+            generator.save_ply(mesh, filename)
+        else:
+            generator.save_stl(mesh, filename)
+        record['export_s'] = time.perf_counter() - start
+
+        record.update(status='ok', n_points=int(mesh.n_points), n_cells=int(mesh.n_cells))
+    except Exception as e:
+        record.update(status='error', error=str(e))
+
+
+def pool(workers=None, trace_memory=False):
+    """Process pool for sweeps, tracing allocations in every worker if
+    ``trace_memory`` is set."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=tracemalloc.start if trace_memory else None)
+
+
+def run_sweep(entries, out_dir, workers=None, method='generate', fmt='stl', post=None, events=None,
+              trace_memory=False, cache_dir=None):
+    """Run every parameter set across a process pool and write
+    ``manifest.json`` to ``out_dir``; returns the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    filenames = []
+    for index, entry in enumerate(entries):
+        name = entry.get('name') or f"{index:04d}_{entry.get('shape', 'radial')}"
+        filenames.append(os.path.join(out_dir, f"{name}.{fmt}"))
+    params = [{k: v for k, v in entry.items() if k != 'name'} for entry in entries]
+
+    start = time.perf_counter()
+    with pool(workers, trace_memory) as executor:
+        records = list(executor.map(run_job, params, filenames, [method] * len(entries), [post] * len(entries),
+                                    [events] * len(entries), [cache_dir] * len(entries)))
+    manifest = {
+        'method': method,
+        'workers': workers or os.cpu_count(),
+        'total_s': time.perf_counter() - start,
+        'failed': sum(r['status'] != 'ok' for r in records),
+        'jobs': records,
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def run_metrics(params, samples=0, seed=None, events=None):
+    """Compute field metrics of one parameter set; returns a record like
+    ``run_job``'s with the metrics in place of the mesh."""
+    record = {'params': params}
+    with hooked(*_hooks(events, EventLog(), params=params)):
+        try:
+            from gyroid_generator import GyroidGenerator
+            record.update(GyroidGenerator().metrics(complete_params(params), samples=samples, seed=seed))
+            record['status'] = 'ok'
+        except Exception as e:
+            record.update(status='error', error=str(e))
+    return record
+
+
+def add_instrument_arguments(parser):
+    parser.add_argument('--events', default=None,
+                        help="Append per-stage timing events to this file as JSON lines ('-' for stdout).")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Trace allocations to report each stage's peak memory (slower).")
+
+
+def add_param_arguments(parser):
+    parser.add_argument('--shape', choices=shape_names(), default=None)
+    for key in DEFAULT_PARAMS:
+        if key == 'mode':
+            parser.add_argument('--mode', choices=MODES, default=None,
+                                help="Extract the surface, a sheet solid |f| <= thickness or the solid f <= 0.")
+            continue
+        kind = {'res': int, 'expression': str}.get(key, float)
+        parser.add_argument(f'--{key}', type=kind, default=None)
+    parser.add_argument('--dtype', choices=DTYPES, default=None,
+                        help="Precision of the field and mesh points (default: float64).")
+
+
+def given_params(args):
+    """The parameters set on the command line."""
+    return {k: getattr(args, k) for k in list(DEFAULT_PARAMS) + ['shape', 'dtype'] if getattr(args, k) is not None}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate gyroid meshes without the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Generate and export a single mesh.")
+    generate.add_argument('-o', '--output', required=True, help="Output .stl, .obj or .ply file.")
+    generate.add_argument('--method', choices=METHODS, default='generate',
+                          help="Generation method. 'sparse' only pays off when few blocks of the grid hold the "
+                               "surface, e.g. cells much larger than the grid spacing or a masked radial grid, "
+                               "and falls back to 'generate' otherwise.")
+    generate.add_argument('--post', type=parse_steps, default=None, help=POST_HELP)
+    generate.add_argument('--cache-dir', default=None, help=CACHE_HELP)
+    add_param_arguments(generate)
+    add_instrument_arguments(generate)
+
+    sweep = commands.add_parser('sweep', help="Generate every parameter set in a sweep file.")
+    sweep.add_argument('sweep_file', help="JSON file of parameter sets.")
+    sweep.add_argument('--out-dir', default='sweep_output')
+    sweep.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores).")
+    sweep.add_argument('--method', choices=METHODS, default='generate')
+    sweep.add_argument('--format', choices=['stl', 'obj', 'ply'], default='stl')
+    sweep.add_argument('--post', type=parse_steps, default=None, help=POST_HELP)
+    sweep.add_argument('--cache-dir', default=None, help=CACHE_HELP)
+    add_instrument_arguments(sweep)
+
+    metrics = commands.add_parser('metrics', help="Compute volume fraction and surface area from the field alone.")
+    metrics.add_argument('-o', '--output', default=None, help="JSON file for the results (default: print them).")
+    metrics.add_argument('--sweep', default=None,
+                         help="JSON sweep file of parameter sets to screen, on top of the parameters given here.")
+    metrics.add_argument('--workers', type=int, default=None, help="Worker processes for a sweep (default: all cores).")
+    metrics.add_argument('--samples', type=int, default=0,
+                         help="Random points for a Monte Carlo estimate of the volume fraction.")
+    metrics.add_argument('--seed', type=int, default=None)
+    add_param_arguments(metrics)
+    add_instrument_arguments(metrics)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace_memory and args.command != 'sweep' and not (args.command == 'metrics' and args.sweep):
+        tracemalloc.start()
+    if args.command == 'generate':
+        params = given_params(args)
+        record = run_job(params, args.output, args.method, args.post, args.events, args.cache_dir)
+        print(json.dumps(record, indent=2))
+        return 0 if record['status'] == 'ok' else 1
+
+    if args.command == 'metrics':
+        params = given_params(args)
+        if args.sweep is None:
+            result = run_metrics(params, args.samples, args.seed, args.events)
+            failed = result['status'] != 'ok'
+        else:
+            entries = [dict(params, **entry) for entry in load_sweep(args.sweep)]
+            n = len(entries)
+            with pool(args.workers, args.trace_memory) as executor:
+                result = list(executor.map(run_metrics, entries, [args.samples] * n, [args.seed] * n,
+                                           [args.events] * n, chunksize=16))
+            failed = any(r['status'] != 'ok' for r in result)
+        for record in result if isinstance(result, list) else [result]:
+            for warning in record.get('warnings', []):
+                print(f"Warning: {warning}", file=sys.stderr)
+        if args.output is None:
+            print(json.dumps(result, indent=2))
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+        return 1 if failed else 0
+
+    manifest = run_sweep(load_sweep(args.sweep_file), args.out_dir, args.workers, args.method, args.format,
+                         args.post, args.events, args.trace_memory, args.cache_dir)
+    print(f"{len(manifest['jobs'])} jobs, {manifest['failed']} failed, "
+          f"{manifest['total_s']:.2f}s; manifest written to {args.out_dir}")
+    return 0 if not manifest['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
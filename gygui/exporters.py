@@ -0,0 +1,176 @@
+"""Binary STL and PLY writers working directly on NumPy point/face arrays.
+
+Records are packed with structured dtypes a chunk of triangles at a time, so
+exporting never builds an intermediate mesh object. Whole meshes can be
+written through a memory-mapped file; the stream writers accept one piece
+at a time, e.g. the slabs of ``GyroidGenerator.iter_slabs``.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Triangles packed per chunk.
+CHUNK_TRIANGLES = 1 << 20
+
+STL_HEADER = b'Binary STL written by gygui'
+STL_RECORD = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+PLY_VERTEX = np.dtype([('xyz', '<f4', 3)])
+PLY_FACE = np.dtype([('count', 'u1'), ('indices', '<i4', 3)])
+# Element counts in a streamed PLY header are zero-padded to this width so
+# the header can be rewritten in place once the counts are known.
+PLY_COUNT_WIDTH = 12
+
+
+def _stl_records(points, faces):
+    records = np.zeros(len(faces), dtype=STL_RECORD)
+    corners = points[faces].astype(np.float32)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, length, out=normals, where=length > 0)
+    records['normal'] = normals
+    records['vertices'] = corners
+    return records
+
+
+def _stl_header(count):
+    return STL_HEADER.ljust(80, b' ') + np.uint32(count).tobytes()
+
+
+def write_stl(filename, points, faces, use_mmap=True, chunk=CHUNK_TRIANGLES):
+    """Write triangles ``faces`` (``(n, 3)`` indices into ``points``) as binary STL."""
+    points = np.asarray(points)
+    faces = np.asarray(faces)
+    if use_mmap and len(faces):
+        data = np.memmap(filename, dtype=np.uint8, mode='w+', shape=(84 + STL_RECORD.itemsize * len(faces),))
+        data[:84] = np.frombuffer(_stl_header(len(faces)), dtype=np.uint8)
+        records = data[84:].view(STL_RECORD)
+        for start in range(0, len(faces), chunk):
+            records[start:start + chunk] = _stl_records(points, faces[start:start + chunk])
+        data.flush()
+        del records, data
+    else:
+        with StlStreamWriter(filename) as writer:
+            writer.write(points, faces, chunk)
+
+
+def _ply_header(n_points, n_faces, width=0):
+    return (f"ply\nformat binary_little_endian 1.0\ncomment written by gygui\n"
+            f"element vertex {n_points:0{width}d}\n"
+            f"property float x\nproperty float y\nproperty float z\n"
+            f"element face {n_faces:0{width}d}\n"
+            f"property list uchar int vertex_indices\nend_header\n").encode('ascii')
+
+
+def _ply_faces(faces):
+    records = np.empty(len(faces), dtype=PLY_FACE)
+    records['count'] = 3
+    records['indices'] = faces
+    return records
+
+
+def write_ply(filename, points, faces, use_mmap=True, chunk=CHUNK_TRIANGLES):
+    """Write a triangle mesh as binary little-endian PLY."""
+    points = np.asarray(points)
+    faces = np.asarray(faces)
+    if not use_mmap:
+        with PlyStreamWriter(filename) as writer:
+            writer.write(points, faces, chunk)
+        return
+
+    header = _ply_header(len(points), len(faces))
+    vertex_bytes = PLY_VERTEX.itemsize * len(points)
+    data = np.memmap(filename, dtype=np.uint8, mode='w+',
+                     shape=(len(header) + vertex_bytes + PLY_FACE.itemsize * len(faces),))
+    data[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+    if len(points):
+        data[len(header):len(header) + vertex_bytes].view(PLY_VERTEX)['xyz'] = points
+    if len(faces):
+        records = data[len(header) + vertex_bytes:].view(PLY_FACE)
+        for start in range(0, len(faces), chunk):
+            records[start:start + chunk] = _ply_faces(faces[start:start + chunk])
+        del records
+    data.flush()
+    del data
+
+
+class StlStreamWriter:
+    """Append triangle pieces to a binary STL file, fixing up the triangle
+    count on close. Pieces need no welding since STL stores every triangle
+    with its own vertices."""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.count = 0
+        self.file.write(_stl_header(0))
+
+    def write(self, points, faces, chunk=CHUNK_TRIANGLES):
+        points = np.asarray(points)
+        faces = np.asarray(faces)
+        for start in range(0, len(faces), chunk):
+            self.file.write(_stl_records(points, faces[start:start + chunk]).tobytes())
+        self.count += len(faces)
+
+    def close(self):
+        self.file.seek(80)
+        self.file.write(np.uint32(self.count).tobytes())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PlyStreamWriter:
+    """Append mesh pieces to a binary PLY file.
+
+    Vertices go straight to the output while faces are spooled to a
+    temporary file and appended on close, since PLY stores all vertices
+    before any face. Pieces are not welded, so seam vertices shared by
+    neighbouring pieces appear once per piece.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.faces = tempfile.TemporaryFile()
+        self.n_points = 0
+        self.n_faces = 0
+        self.file.write(_ply_header(0, 0, PLY_COUNT_WIDTH))
+
+    def write(self, points, faces, chunk=CHUNK_TRIANGLES):
+        points = np.asarray(points)
+        faces = np.asarray(faces)
+        vertices = np.empty(len(points), dtype=PLY_VERTEX)
+        vertices['xyz'] = points
+        self.file.write(vertices.tobytes())
+        for start in range(0, len(faces), chunk):
+            self.faces.write(_ply_faces(faces[start:start + chunk] + self.n_points).tobytes())
+        self.n_points += len(points)
+        self.n_faces += len(faces)
+
+    def close(self):
+        self.faces.seek(0)
+        shutil.copyfileobj(self.faces, self.file)
+        self.faces.close()
+        self.file.seek(0)
+        self.file.write(_ply_header(self.n_points, self.n_faces, PLY_COUNT_WIDTH))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_writer(filename):
+    """Return the stream writer matching the file extension (.stl or .ply)."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.ply':
+        return PlyStreamWriter(filename)
+    if ext == '.stl':
+        return StlStreamWriter(filename)
+    raise ValueError(f"Unsupported streaming format: {ext}")
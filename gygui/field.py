@@ -0,0 +1,215 @@
+"""Scalar field evaluation for the gyroid generator.
+
+Every supported surface is a sum of products of per-axis trig terms, so the
+field is assembled from 1-D trig tables by broadcasting instead of running
+sin/cos over full res^3 coordinate arrays.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from instrument import stage
+from surfaces import is_radial, surface_kernel
+
+# Number of voxels processed per block when filling the field; small enough
+# for a block and its scratch buffer to stay in cache while it is assembled.
+BLOCK_SIZE = 1 << 16
+# Voxel budget per slab when the grid is split along z and no size is given.
+SLAB_VOXELS = 1 << 24
+# Precision of fields and mesh points unless ``params['dtype']`` says
+# otherwise; previews use float32, which halves their memory.
+DEFAULT_DTYPE = 'float64'
+PREVIEW_DTYPE = 'float32'
+# What is extracted: the zero isosurface, the sheet solid |f| <= thickness,
+# or the solid network f <= 0.
+MODES = ('surface', 'sheet', 'solid')
+
+
+def field_dtype(params):
+    return np.dtype(params.get('dtype', DEFAULT_DTYPE))
+
+
+def field_mode(params):
+    mode = params.get('mode', 'surface')
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+    return mode
+
+
+def grid_axes(params, z_range=None):
+    """Sample positions along each grid axis, matching ``np.mgrid[0:a:res*1j]``.
+
+    ``z_range`` is an optional ``(start, stop)`` pair of plane indices that
+    restricts the z axis to a slab of the full grid.
+    """
+    res = params['res']
+    u, v, w = [np.linspace(0, params[p], res) for p in ('a', 'b', 'c')]
+    if z_range is not None:
+        w = w[slice(*z_range)]
+    return u, v, w
+
+
+def slab_ranges(res, slab_size=None, voxels=SLAB_VOXELS):
+    """Split the z axis into ``(start, stop)`` slabs that overlap by one plane.
+
+    Consecutive slabs share their boundary plane, so contours of the slabs
+    meet without gaps and their seam vertices coincide exactly.
+    """
+    if slab_size is None:
+        slab_size = max(1, voxels // (res * res) - 1)
+    return [(k0, min(k0 + slab_size + 1, res)) for k0 in range(0, res - 1, slab_size)]
+
+
+def axis_scales(params):
+    """Return the factors mapping grid positions to the arguments X, Y, Z."""
+    if is_radial(params):
+        scale_x = 2 * np.pi * params['cell_radius'] / params['a']
+        scale_y = 2 * np.pi * params['cell_radius'] / params['b']
+        scale_z = 2 * np.pi * params['cell_height'] / params['c']
+        return scale_x, params['phi_scale'] * scale_y, scale_z
+    density = params.get('density', 1)
+    return tuple(2 * np.pi / params[p] * density for p in ('a', 'b', 'c'))
+
+
+def axis_phases(params, u, v, w):
+    """Return the per-axis arguments X, Y, Z of the TPMS expression."""
+    kx, ky, kz = axis_scales(params)
+    return u * kx, v * ky, w * kz
+
+
+def separable_terms(params, X, Y, Z):
+    """Express the shape's field as ``sum(fx(x) * fy(y) * fz(z))``.
+
+    Returns a list of ``(fx, fy, fz)`` triples of 1-D factor tables, where
+    None stands for a factor of 1. Tables are shared between terms, so a
+    trig term that appears several times is computed only once.
+    """
+    kernel = surface_kernel(params)
+    return kernel.combine([kernel.axis_tables(axis, t) for axis, t in enumerate((X, Y, Z))], len(X))
+
+
+def trig_tables(params, axes):
+    """Factor tables of each axis in the field's dtype.
+
+    Phases are computed in float64 and only the tables are rounded.
+    """
+    kernel = surface_kernel(params)
+    dtype = field_dtype(params)
+    return [kernel.axis_tables(axis, t * scale, dtype)
+            for axis, (t, scale) in enumerate(zip(axes, axis_scales(params)))]
+
+
+def plane_terms(terms):
+    """Group separable terms into ``sum(table(x, y) * factor(z))``.
+
+    Returns a list of ``(table, factor)`` pairs where ``table`` broadcasts to
+    ``(nx, ny)`` and ``factor`` is a 1-D array over z, or None for terms that
+    do not depend on z. Terms sharing a z factor share one xy table.
+    """
+    groups = {}
+    for fx, fy, fz in terms:
+        if fx is None:
+            table = fy[None, :]
+        elif fy is None:
+            table = fx[:, None]
+        else:
+            table = np.outer(fx, fy)
+        key = id(fz)
+        if key in groups:
+            groups[key] = (groups[key][0] + table, fz)
+        else:
+            groups[key] = (table, fz)
+    return list(groups.values())
+
+
+class TrigCache:
+    """Per-axis factor tables of recently evaluated parameter sets.
+
+    An axis's tables depend only on its sample positions, phase scale and
+    the surface's factors along it,
+    so when a single parameter changes, e.g. ``cell_height``, only the axes
+    it affects are recomputed.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._tables = OrderedDict()
+
+    def tables(self, params, axes):
+        """Return the factor tables of each axis in ``axes``."""
+        kernel = surface_kernel(params)
+        dtype = field_dtype(params)
+        result = []
+        for axis, (t, scale) in enumerate(zip(axes, axis_scales(params))):
+            key = (dtype.str, float(scale), t.tobytes(), kernel.axis_key(axis))
+            tables = self._tables.pop(key, None)
+            if tables is None:
+                tables = kernel.axis_tables(axis, t * scale, dtype)
+            self._tables[key] = tables
+            result.append(tables)
+        while len(self._tables) > self.max_entries:
+            self._tables.popitem(last=False)
+        return result
+
+
+def radial_mask(params, u):
+    """Boolean mask over the r_aux axis for points outside the outer radius."""
+    r = (params['r2'] - params['r1']) / params['a'] * u + params['r1']
+    return r > params['r1']
+
+
+def evaluate_field(params, out=None, z_range=None, axes=None, trig=None):
+    """Evaluate the shape's scalar field on the ``res^3`` grid, or a z-slab of it.
+
+    ``axes`` optionally replaces the grid's sample positions with three 1-D
+    arrays, e.g. to sample a single unit cell. ``trig`` is an optional
+    ``TrigCache`` to take the per-axis trig tables from. The result has shape
+    ``(nx, ny, nz)`` in Fortran order, so ``values.ravel('F')`` is a view in
+    VTK point order, and the dtype given by ``params['dtype']``. In sheet
+    mode the result is ``|f| - thickness``, so that, as for the other modes,
+    the solid is where the field is negative.
+
+    The grid is filled in cache-sized blocks: each block is assembled from
+    the xy tables and z factors before moving on, so every value is written
+    to main memory once and no full-size intermediate is created. The
+    radial mask is applied afterwards and only touches the masked rows.
+    """
+    with stage('grid'):
+        u, v, w = grid_axes(params) if axes is None else axes
+        if z_range is not None:
+            w = w[slice(*z_range)]
+        tables = trig_tables(params, (u, v, w)) if trig is None else trig.tables(params, (u, v, w))
+        nx, ny, nz = len(u), len(v), len(w)
+        terms = [(np.broadcast_to(table, (nx, ny)), factor)
+                 for table, factor in plane_terms(surface_kernel(params).combine(tables, nx))]
+    dtype = field_dtype(params)
+    thickness = params.get('thickness', 0) if field_mode(params) == 'sheet' else None
+    if out is None:
+        out = np.empty((nx, ny, nz), dtype=dtype, order='F')
+
+    with stage('field', voxels=nx * ny * nz):
+        # Blocks span whole x rows, then as many y rows and z planes as fit
+        rows = max(1, min(ny, BLOCK_SIZE // nx))
+        planes = max(1, min(nz, BLOCK_SIZE // (nx * rows)))
+        scratch = np.empty(nx * rows * planes, dtype=out.dtype)
+        for k0 in range(0, nz, planes):
+            k1 = min(k0 + planes, nz)
+            for j0 in range(0, ny, rows):
+                j1 = min(j0 + rows, ny)
+                block = out[:, j0:j1, k0:k1]
+                tmp = scratch[:block.size].reshape(block.shape, order='F')
+                for i, (table, factor) in enumerate(terms):
+                    dest = block if i == 0 else tmp
+                    if factor is None:
+                        np.copyto(dest, table[:, j0:j1, None])
+                    else:
+                        np.multiply(table[:, j0:j1, None], factor[k0:k1], out=dest)
+                    if i:
+                        np.add(block, tmp, out=block)
+                if thickness is not None:
+                    np.abs(block, out=block)
+                    block -= thickness
+    if is_radial(params):
+        with stage('mask'):
+            out[radial_mask(params, u)] = 1
+    return out
@@ -3,10 +3,29 @@ import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                              QFileDialog, QMessageBox, QColorDialog, QFormLayout,
-                             QFrame, QComboBox)
+                             QFrame, QComboBox, QProgressBar, QCheckBox, QSlider)
 from PyQt5.QtGui import QFont, QIcon
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer
 from pyvistaqt import QtInteractor
+from field import MODES, PREVIEW_DTYPE, TrigCache
+from instrument import EventLog, hooked, peak_rss, stage_totals
+from parameters import DEFAULT_PARAMS, PARAM_RANGES, complete_params, shape_names, shape_params
+from surfaces import compile_expression
+from lod import DISPLAY_BUDGET
+from worker import GenerationWorker
+
+# Resolution cap of live previews, chosen to regenerate in well under 100 ms
+LIVE_PREVIEW_RES = 64
+# Quiet time after the last edit before a live preview is generated, longer
+# than the gap between keystrokes so a value typed in full previews once
+LIVE_DEBOUNCE_MS = 200
+# Longest gap between live previews while a slider is dragged, so the
+# preview follows the drag instead of waiting for it to stop
+LIVE_THROTTLE_MS = 50
+# Positions of a parameter slider
+SLIDER_STEPS = 1000
+# Stages shown in the status bar, in pipeline order
+STATUS_STAGES = ('grid', 'field', 'mask', 'contour', 'postprocess', 'export', 'render')
 
 class GyroidGeneratorGUI(QMainWindow):
     def __init__(self, gyroid_generator, visualization):
@@ -27,12 +46,7 @@ class GyroidGeneratorGUI(QMainWindow):
         self.setCentralWidget(main_widget)
         main_layout = QHBoxLayout(main_widget)
 
-        # Initialize shape_params and current_shape
-        self.shape_params = {
-            'radial': ['res', 'a', 'b', 'c', 'r1', 'r2', 'phi_scale', 'cell_radius', 'cell_height'],
-            'cartesian': ['res', 'a', 'b', 'c', 'density'],
-            'diamond': ['res', 'a', 'b', 'c', 'density']
-        }
+        # Initialize current_shape
         self.current_shape = 'radial'
 
         # Setup the left panel for parameters and buttons
@@ -43,8 +57,29 @@ class GyroidGeneratorGUI(QMainWindow):
         main_layout.addWidget(self.plotter, 2)
 
         self.gyroid_mesh = None
+        self.gyroid_lod = None
         self.gyroid_colors = [[1, 1, 1], [0, 0, 0]]  # Default colors: white and black
 
+        # Background generation jobs; results from any job other than the
+        # latest are discarded.
+        self.job_id = 0
+        self.jobs = {}
+        # Threads of jobs that may still be running, waited for on close
+        self.threads = set()
+        # Stage events of the latest finished job, for the status bar
+        self.job_events = []
+        self.statusBar().showMessage("Ready")
+
+        # Live previews run on the GUI thread once edits pause, reusing the
+        # per-axis trig tables of earlier previews.
+        self.trig_cache = TrigCache()
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_DEBOUNCE_MS)
+        self.live_timer.timeout.connect(self.update_live_preview)
+        # Set while a slider writes its value into a parameter field
+        self.live_throttled = False
+
     def setup_left_panel(self, main_layout):
         left_panel = QFrame()
         left_panel.setFrameShape(QFrame.StyledPanel)
@@ -56,23 +91,49 @@ class GyroidGeneratorGUI(QMainWindow):
         shape_layout = QHBoxLayout()
         shape_label = QLabel("Shape:")
         self.shape_combo = QComboBox()
-        self.shape_combo.addItems(['radial', 'cartesian', 'diamond'])
+        self.shape_combo.addItems(shape_names())
         self.shape_combo.currentTextChanged.connect(self.on_shape_changed)
         shape_layout.addWidget(shape_label)
         shape_layout.addWidget(self.shape_combo)
         left_layout.addLayout(shape_layout)
+
+        mode_layout = QHBoxLayout()
+        mode_label = QLabel("Mode:")
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(MODES)
+        self.mode_combo.setToolTip("Extract the surface, a sheet solid of the given thickness, or the solid network.")
+        self.mode_combo.currentTextChanged.connect(self.cancel_generation)
+        self.mode_combo.currentTextChanged.connect(self.schedule_live_preview)
+        mode_layout.addWidget(mode_label)
+        mode_layout.addWidget(self.mode_combo)
+        left_layout.addLayout(mode_layout)
+
+        self.live_check = QCheckBox("Live Preview")
+        self.live_check.setToolTip("Regenerate a low-resolution preview whenever a parameter changes.")
+        self.live_check.toggled.connect(self.schedule_live_preview)
+        left_layout.addWidget(self.live_check)
         
         # Parameter inputs and buttons
         self.form_layout = QFormLayout()
         self.params = self.create_param_inputs(self.form_layout)
         left_layout.addLayout(self.form_layout)
+
+        # Triangle budget for the viewport; the exact mesh is still saved
+        budget_layout = QFormLayout()
+        self.budget_edit = QLineEdit(str(DISPLAY_BUDGET))
+        self.budget_edit.setToolTip("Maximum number of triangles shown in the viewport.")
+        self.budget_edit.editingFinished.connect(self.on_budget_changed)
+        budget_layout.addRow(QLabel("Display Budget:"), self.budget_edit)
+        left_layout.addLayout(budget_layout)
         self.create_buttons(left_layout)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        left_layout.addWidget(self.progress_bar)
+
     def create_param_inputs(self, layout):
-        default_params = {
-            'res': 80, 'a': 24, 'b': 24, 'c': 10, 'r1': 12, 'r2': 0,
-            'phi_scale': 8, 'cell_radius': 2, 'cell_height': 3, 'density': 1
-        }
+        default_params = DEFAULT_PARAMS
         param_descriptions = {
             'res': 'Resolution of the grid in each dimension.',
             'a': 'Dimension length along the X-axis.',
@@ -83,24 +144,37 @@ class GyroidGeneratorGUI(QMainWindow):
             'phi_scale': 'Scaling factor for the angular coordinate.',
             'cell_radius': 'Radius of the cells in the gyroid structure.',
             'cell_height': 'Height of the cells in the gyroid structure.',
-            'density': 'Density factor for Cartesian and Diamond gyroids.'
+            'density': 'Number of unit cells along each axis for Cartesian shapes.',
+            'expression': 'Surface formula in x, y and z, e.g. cos(x) + cos(y) + cos(z).',
+            'thickness': 'Sheet half-width in field units; the sheet is where |f| <= thickness.'
         }
         param_labels = {
             'res': 'Resolution', 'a': 'X-axis Length', 'b': 'Y-axis Length',
             'c': 'Z-axis Length', 'r1': 'Inner Radius', 'r2': 'Outer Radius',
             'phi_scale': 'Angular Scaling Factor', 'cell_radius': 'Cell Radius',
-            'cell_height': 'Cell Height', 'density': 'Density'
+            'cell_height': 'Cell Height', 'density': 'Density', 'expression': 'Expression',
+            'thickness': 'Sheet Thickness'
         }
         params = {}
-        for key in self.shape_params[self.current_shape]:
+        for key in shape_params(self.current_shape):
             label, line_edit = self.create_param_input(key, default_params[key], param_labels[key], param_descriptions[key])
-            layout.addRow(label, line_edit)
+            if key not in PARAM_RANGES:
+                line_edit.setFixedWidth(300)
+                layout.addRow(label, line_edit)
+                params[key] = line_edit
+                continue
+            row = QHBoxLayout()
+            row.addWidget(line_edit)
+            row.addWidget(self.create_param_slider(key, line_edit))
+            layout.addRow(label, row)
             params[key] = line_edit
         return params
 
     def on_shape_changed(self, shape):
+        self.cancel_generation()
         self.current_shape = shape
         self.update_param_inputs()
+        self.schedule_live_preview()
 
     def update_param_inputs(self):
         # Clear existing inputs
@@ -117,6 +191,8 @@ class GyroidGeneratorGUI(QMainWindow):
         
         line_edit = QLineEdit(str(default_value))
         line_edit.setToolTip(description)
+        line_edit.textChanged.connect(self.cancel_generation)
+        line_edit.textChanged.connect(self.schedule_live_preview)
         line_edit.setFixedWidth(100)
         line_edit.setStyleSheet("""
             QLineEdit {
@@ -128,6 +204,33 @@ class GyroidGeneratorGUI(QMainWindow):
         
         return label, line_edit
 
+    def create_param_slider(self, key, line_edit):
+        lo, hi = PARAM_RANGES[key]
+        slider = QSlider(Qt.Horizontal)
+        slider.setRange(0, SLIDER_STEPS)
+
+        def to_slider(text):
+            try:
+                position = (float(text) - lo) / (hi - lo) * SLIDER_STEPS
+            except ValueError:
+                return
+            slider.blockSignals(True)
+            slider.setValue(int(round(min(max(position, 0), SLIDER_STEPS))))
+            slider.blockSignals(False)
+
+        def to_text(position):
+            value = lo + (hi - lo) * position / SLIDER_STEPS
+            self.live_throttled = True
+            try:
+                line_edit.setText(str(int(round(value))) if key == 'res' else f"{round(value, 3):g}")
+            finally:
+                self.live_throttled = False
+
+        to_slider(line_edit.text())
+        line_edit.textEdited.connect(to_slider)
+        slider.valueChanged.connect(to_text)
+        return slider
+
     def create_buttons(self, layout):
         button_layout = QHBoxLayout()
         
@@ -147,7 +250,7 @@ class GyroidGeneratorGUI(QMainWindow):
         """)
         button_layout.addWidget(generate_button)
 
-        save_button = QPushButton("Save STL/OBJ")
+        save_button = QPushButton("Save STL/OBJ/PLY")
         save_button.clicked.connect(self.save_mesh)
         save_button.setStyleSheet("""
             QPushButton {
@@ -162,49 +265,184 @@ class GyroidGeneratorGUI(QMainWindow):
             }
         """)
         button_layout.addWidget(save_button)
+
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.cancel_generation)
+        cancel_button.setStyleSheet("""
+            QPushButton {
+                background-color: #f44336;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #da190b;
+            }
+        """)
+        button_layout.addWidget(cancel_button)
         
         layout.addLayout(button_layout)
 
+    def read_params(self):
+        params = {k: v.text() if k == 'expression' else float(v.text()) for k, v in self.params.items()}
+        params['shape'] = self.current_shape
+        params['mode'] = self.mode_combo.currentText()
+        if 'expression' in params:
+            compile_expression(params['expression'])
+        # Fill in default values for parameters not used by this shape
+        return complete_params(params)
+
+    def display_budget(self):
+        try:
+            return max(1, int(self.budget_edit.text()))
+        except ValueError:
+            return DISPLAY_BUDGET
+
     def generate_gyroid(self):
         try:
-            params = {k: float(v.text()) for k, v in self.params.items()}
-            params['res'] = int(params['res'])
-            params['shape'] = self.current_shape
-
-            if self.current_shape in ['cartesian', 'diamond']:
-                # Add default values for parameters not used by these shapes
-                params['r1'] = 0
-                params['r2'] = 0
-                params['phi_scale'] = 1
-                params['cell_radius'] = 1
-                params['cell_height'] = 1
-                # Ensure density is included
-                if 'density' not in params:
-                    params['density'] = 1
-
-            self.gyroid_mesh = self.gyroid_generator.generate(params)
-
-            # Visualize
-            self.visualization.render(self.plotter, self.gyroid_mesh, self.gyroid_colors)
-
-            QMessageBox.information(self, "Success", "Gyroid generated successfully!")
+            params = self.read_params()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to generate gyroid: {str(e)}")
+            return
+
+        # Run the generation on a worker thread so the window stays
+        # responsive; previews arrive first, then the full-resolution mesh.
+        self.cancel_generation()
+        self.job_id += 1
+        thread = QThread(self)
+        worker = GenerationWorker(self.job_id, self.gyroid_generator, params, self.display_budget())
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.preview.connect(self.on_preview)
+        worker.progress.connect(self.on_progress)
+        worker.timings.connect(self.on_timings)
+        worker.completed.connect(self.on_generated)
+        worker.failed.connect(self.on_generation_failed)
+        worker.done.connect(thread.quit)
+        worker.done.connect(self.on_job_done)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(lambda: self.threads.discard(thread))
+        self.jobs[self.job_id] = worker
+        self.threads.add(thread)
+        self.progress_bar.setValue(0)
+        thread.start()
+
+    def cancel_generation(self):
+        for worker in self.jobs.values():
+            worker.cancel()
+        self.progress_bar.setValue(0)
+
+    def closeEvent(self, event):
+        # A QThread destroyed while running aborts the process, so stop the
+        # jobs and wait for them. Their done signals, which quit the threads,
+        # are queued to this thread and cannot arrive while it waits.
+        self.cancel_generation()
+        for thread in list(self.threads):
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
+
+    def schedule_live_preview(self):
+        if not self.live_check.isChecked():
+            return
+        if not self.live_throttled:
+            # Restart the timer on every typed edit so only the last one is generated
+            self.live_timer.start(LIVE_DEBOUNCE_MS)
+        elif not self.live_timer.isActive() or self.live_timer.remainingTime() > LIVE_THROTTLE_MS:
+            # Leave a running timer alone so a drag previews at a steady rate;
+            # the preview reads the fields when it fires, so it has the latest value
+            self.live_timer.start(LIVE_THROTTLE_MS)
+
+    def update_live_preview(self):
+        try:
+            params = self.read_params()
+        except ValueError:
+            # Incomplete input while typing
+            return
+        if params['res'] < 2 or min(params['a'], params['b'], params['c']) <= 0:
+            # Partly typed values, e.g. "1" on the way to "100"
+            return
+        params['res'] = min(params['res'], LIVE_PREVIEW_RES)
+        params['dtype'] = PREVIEW_DTYPE
+        log = EventLog()
+        with hooked(log):
+            try:
+                mesh = self.gyroid_generator.generate_preview(params, self.trig_cache)
+            except Exception as e:
+                # The user may still be typing, so do not interrupt with a dialog
+                self.statusBar().showMessage(f"Failed to generate preview: {str(e)}")
+                return
+            self.visualization.render(self.plotter, mesh, self.gyroid_colors)
+        self.show_timings("Preview", log.events)
+
+    def on_preview(self, job_id, mesh):
+        if job_id == self.job_id and mesh.n_cells <= self.display_budget():
+            self.visualization.render(self.plotter, mesh, self.gyroid_colors)
+
+    def on_progress(self, job_id, percent):
+        if job_id == self.job_id:
+            self.progress_bar.setValue(percent)
+
+    def on_timings(self, job_id, log):
+        if job_id == self.job_id:
+            self.job_events = log.events
+
+    def on_generated(self, job_id, lod):
+        if job_id != self.job_id:
+            return
+        self.gyroid_lod = lod
+        self.gyroid_mesh = lod.exact
+        self.progress_bar.setValue(100)
+
+        # Visualize the finest level within the display budget
+        log = EventLog()
+        with hooked(log):
+            self.visualization.render(self.plotter, lod.select(self.display_budget()), self.gyroid_colors)
+        self.show_timings(f"Generated {lod.exact.n_cells:,} triangles", self.job_events + log.events)
+
+    def show_timings(self, action, events):
+        """Show the time spent in each stage of ``events`` in the status bar."""
+        totals = stage_totals(events)
+        parts = [f"{name} {totals[name]:.2f} s" for name in STATUS_STAGES if name in totals]
+        wall = sum(e['seconds'] for e in events if e['depth'] == 0)
+        message = f"{action} in {wall:.2f} s: " + ", ".join(parts)
+        peak = peak_rss(events)
+        if peak is not None:
+            message += f"; peak RSS {peak / 2 ** 20:.0f} MB"
+        self.statusBar().showMessage(message)
+
+    def on_budget_changed(self):
+        if self.gyroid_lod is not None:
+            self.visualization.render(self.plotter, self.gyroid_lod.select(self.display_budget()),
+                                      self.gyroid_colors)
+
+    def on_generation_failed(self, job_id, message):
+        if job_id == self.job_id:
+            QMessageBox.critical(self, "Error", f"Failed to generate gyroid: {message}")
+
+    def on_job_done(self, job_id):
+        self.jobs.pop(job_id, None)
 
     def save_mesh(self):
         if self.gyroid_mesh is None:
             QMessageBox.warning(self, "Warning", "Please generate a gyroid first.")
             return
 
-        options = "STL Files (*.stl);;OBJ Files (*.obj)"
-        filename, filetype = QFileDialog.getSaveFileName(self, "Save STL/OBJ", "", options)
+        options = "STL Files (*.stl);;OBJ Files (*.obj);;PLY Files (*.ply)"
+        filename, filetype = QFileDialog.getSaveFileName(self, "Save STL/OBJ/PLY", "", options)
 
         if filename:
             try:
-                if filetype == "OBJ Files (*.obj)":
-                    self.gyroid_generator.save_obj(self.gyroid_mesh, filename)
-                else:
-                    self.gyroid_generator.save_stl(self.gyroid_mesh, filename)
+                log = EventLog()
+                with hooked(log):
+                    if filetype == "OBJ Files (*.obj)":
+                        self.gyroid_generator.save_obj(self.gyroid_mesh, filename)
+                    elif filetype == "PLY Files (*.ply)":
+                        self.gyroid_generator.save_ply(self.gyroid_mesh, filename)
+                    else:
+                        self.gyroid_generator.save_stl(self.gyroid_mesh, filename)
+                self.show_timings("Saved", log.events)
                 QMessageBox.information(self, "Success", f"Mesh saved as {filename}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save mesh: {str(e)}")
@@ -213,5 +451,4 @@ class GyroidGeneratorGUI(QMainWindow):
         color = QColorDialog.getColor()
         if color.isValid():
             self.gyroid_colors[color_index - 1] = [color.red() / 255, color.green() / 255, color.blue() / 255]
-            if self.gyroid_mesh:
-                self.visualization.render(self.plotter, self.gyroid_mesh, self.gyroid_colors)
\ No newline at end of file
+            self.visualization.update_colors(self.plotter, self.gyroid_colors)
\ No newline at end of file
@@ -1,58 +1,93 @@
-import numpy as np
 import pyvista as pv
 import trimesh
 
+from exporters import stream_writer, write_ply, write_stl
+from field import evaluate_field, slab_ranges
+from instrument import stage
+from meshing import contour_field, merge_meshes, seam_planes, triangles
+from metrics import field_metrics
+from parallel import generate_parallel
+from periodic import generate_periodic
+from postprocess import DEFAULT_STEPS, run_steps
+from sparse import BLOCK_EDGE, generate_sparse
+
 class GyroidGenerator:
+    # Every generate method runs as a 'generate' stage (see instrument.py)
+    # around the grid, field, mask and contour stages it is made of.
     def generate(self, params):
-        kx, ky, kz = [2 * np.pi / params[p] for p in ('a', 'b', 'c')]
-        
-        if params['shape'] == 'radial':
-            # Original radial gyroid implementation
-            r_aux, phi, z = np.mgrid[0:params['a']:params['res'] * 1j, 0:params['b']:params['res'] * 1j, 0:params['c']:params['res'] * 1j]
-            r = (params['r2'] - params['r1']) / params['a'] * r_aux + params['r1']
-            
-            scale_x = 2 * np.pi * params['cell_radius'] / params['a']
-            scale_y = 2 * np.pi * params['cell_radius'] / params['b']
-            scale_z = 2 * np.pi * params['cell_height'] / params['c']
-            
-            fun_values = np.cos(r_aux * scale_x) * np.sin(phi * params['phi_scale'] * scale_y) + \
-                         np.cos(phi * params['phi_scale'] * scale_y) * np.sin(z * scale_z) + \
-                         np.cos(z * scale_z) * np.sin(r_aux * scale_x)
-            
-            outer_mask = r > params['r1']
-            fun_values[outer_mask] = 1
-            
-            x = r * np.cos(phi * ky)
-            y = r * np.sin(phi * ky)
-            
-        elif params['shape'] in ['cartesian', 'diamond']:
-            x, y, z = np.mgrid[0:params['a']:params['res'] * 1j, 
-                               0:params['b']:params['res'] * 1j, 
-                               0:params['c']:params['res'] * 1j]
-            
-            # Get the density factor, default to 1 if not provided
-            density = params.get('density', 1)
-            
-            if params['shape'] == 'cartesian':
-                fun_values = np.sin(kx * x * density) * np.cos(ky * y * density) + \
-                             np.sin(ky * y * density) * np.cos(kz * z * density) + \
-                             np.sin(kz * z * density) * np.cos(kx * x * density)
-            else:  # diamond
-                fun_values = np.sin(kx * x * density) * np.sin(ky * y * density) * np.sin(kz * z * density) + \
-                             np.sin(kx * x * density) * np.cos(ky * y * density) * np.cos(kz * z * density) + \
-                             np.cos(kx * x * density) * np.sin(ky * y * density) * np.cos(kz * z * density) + \
-                             np.cos(kx * x * density) * np.cos(ky * y * density) * np.sin(kz * z * density)
-        else:
-            raise ValueError(f"Unknown shape: {params['shape']}")
-
-        grid = pv.StructuredGrid(x, y, z)
-        grid["vol"] = fun_values.ravel('F')
-        return grid.contour([0])
+        with stage('generate', method='generate', res=params['res']):
+            return contour_field(params, evaluate_field(params))
+
+    def generate_preview(self, params, trig):
+        # Reuses the per-axis trig tables in ``trig`` between calls, so
+        # parameter changes only recompute the axes they affect.
+        with stage('generate', method='preview', res=params['res']):
+            return contour_field(params, evaluate_field(params, trig=trig))
+
+    def generate_streaming(self, params, slab_size=None, progress=None):
+        # Peak memory is bounded by the slab size plus the output mesh.
+        with stage('generate', method='streaming', res=params['res']):
+            seams = seam_planes(params, [k0 for k0, _ in slab_ranges(params['res'], slab_size)[1:]])
+            return merge_meshes(self.iter_slabs(params, slab_size, progress), seams)
+
+    def generate_parallel(self, params, workers=None, tile_size=None):
+        # Stages run in the worker processes are not reported.
+        with stage('generate', method='parallel', res=params['res']):
+            return generate_parallel(params, workers, tile_size)
+
+    def generate_periodic(self, params, cell_res=None):
+        # Contour one unit cell and replicate it across the lattice.
+        with stage('generate', method='periodic', res=params['res']):
+            return generate_periodic(params, cell_res)
+
+    def generate_sparse(self, params, block_edge=BLOCK_EDGE):
+        # Skip blocks whose field bound shows they cannot hold the surface.
+        # Blocks are evaluated in many small calls, so their stages are
+        # folded into this one.
+        with stage('generate', aggregate=True, method='sparse', res=params['res']):
+            return generate_sparse(params, block_edge)
+
+    def iter_slabs(self, params, slab_size=None, progress=None):
+        """Yield the contour of each z-slab of the grid in turn.
+
+        ``progress`` is called as ``progress(done, total)`` after each slab
+        and may raise to abort the run.
+        """
+        ranges = slab_ranges(params['res'], slab_size)
+        for done, z_range in enumerate(ranges, 1):
+            mesh = contour_field(params, evaluate_field(params, z_range=z_range), (0, 0, z_range[0]))
+            if progress is not None:
+                progress(done, len(ranges))
+            yield mesh
+
+    def export_streaming(self, params, filename, slab_size=None, progress=None):
+        # Write each slab as soon as it is contoured; the full mesh is never held.
+        with stage('generate', method='export_streaming', res=params['res']), stream_writer(filename) as writer:
+            for mesh in self.iter_slabs(params, slab_size, progress):
+                with stage('export', path=filename):
+                    writer.write(mesh.points, triangles(mesh))
+
+    def metrics(self, params, res=None, samples=0, seed=None):
+        # Volume fraction and surface area from the field, without meshing.
+        return field_metrics(params, res, samples, seed)
+
+    def postprocess(self, mesh, steps=DEFAULT_STEPS):
+        """Run post-processing steps on ``mesh``; returns the new mesh and
+        the per-step report (see ``postprocess.run_steps``)."""
+        points, faces, report = run_steps(mesh.points, triangles(mesh), steps)
+        return pv.PolyData.from_regular_faces(points, faces), report
 
     def save_stl(self, mesh, filename):
-        mesh.save(filename)
+        with stage('export', path=filename, n_cells=mesh.n_cells):
+            write_stl(filename, mesh.points, triangles(mesh))
+
+    def save_ply(self, mesh, filename):
+        with stage('export', path=filename, n_cells=mesh.n_cells):
+            write_ply(filename, mesh.points, triangles(mesh))
 
     def save_obj(self, mesh, filename):
-        # Convert PyVista mesh to Trimesh format
-        trimesh_mesh = trimesh.Trimesh(vertices=mesh.points, faces=mesh.faces.reshape((-1, 4))[:, 1:])
-        trimesh_mesh.export(filename)
+        # Convert PyVista mesh to Trimesh format; the mesh is already clean,
+        # so skip trimesh's vertex merging and validation
+        with stage('export', path=filename, n_cells=mesh.n_cells):
+            trimesh_mesh = trimesh.Trimesh(vertices=mesh.points, faces=triangles(mesh), process=False)
+            trimesh_mesh.export(filename)
@@ -0,0 +1,229 @@
+"""Per-stage timing and memory instrumentation.
+
+Code marks the stages of a run with ``with stage('contour'):``. Registered
+hooks are called with an event dict when a stage starts and when it ends;
+end events carry the stage's wall time, the process's peak resident memory
+so far and, while ``tracemalloc`` is tracing, the peak memory allocated
+during the stage. tracemalloc sees memory allocated through Python, NumPy
+arrays included, but not VTK's own buffers. Stages nest, and each event
+records its depth and thread.
+
+Hooks are plain callables, added with ``add_hook`` or for the duration of a
+block with ``hooked``. ``EventLog`` collects events, ``JsonLinesHook``
+writes them to a file and ``StageProfiler`` runs cProfile over chosen
+stages, so where time goes can be attributed without touching the
+instrumented code. Without hooks a stage only times itself.
+
+A stage opened with ``aggregate=True`` folds the stages nested in it into
+per-name counts and totals in its own end event instead of emitting them,
+for code that runs small stages many times, e.g. once per block.
+"""
+import contextlib
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then not reported.
+    resource = None
+
+_hooks = []
+_local = threading.local()
+
+
+def add_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def hooked(*hooks):
+    """Register ``hooks`` for the duration of the block."""
+    for hook in hooks:
+        add_hook(hook)
+    try:
+        yield
+    finally:
+        for hook in hooks:
+            remove_hook(hook)
+
+
+def max_rss():
+    """Peak resident memory of the process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Frame:
+    def __init__(self, owner):
+        # The aggregating stage this one reports to, if any
+        self.owner = owner
+        self.substages = {}
+        self.base = self.peak = 0
+
+
+def _emit(event):
+    for hook in list(_hooks):
+        hook(event)
+
+
+@contextlib.contextmanager
+def stage(name, aggregate=False, **details):
+    """Time the enclosed block as stage ``name``.
+
+    Yields the end event, which is filled in when the block exits, so
+    callers can read e.g. ``event['seconds']`` afterwards. ``details`` are
+    added to both events.
+    """
+    event = {'stage': name, **details}
+    start = time.perf_counter()
+    if not _hooks:
+        try:
+            yield event
+        finally:
+            event['seconds'] = time.perf_counter() - start
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    parent = stack[-1] if stack else None
+    owner = parent.owner if parent is not None else None
+    frame = _Frame(owner)
+    if owner is None and aggregate:
+        frame.owner = frame
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Peaks are tracked per frame; the global peak is reset at every
+        # stage boundary and folded into the enclosing frame first.
+        current, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        frame.base = frame.peak = current
+
+    event.update(depth=len(stack), thread=threading.get_ident(), time=time.time())
+    if owner is None:
+        _emit(dict(event, phase='start'))
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield event
+    except BaseException:
+        event['failed'] = True
+        raise
+    finally:
+        event['seconds'] = time.perf_counter() - start
+        stack.pop()
+        if tracing and tracemalloc.is_tracing():
+            frame.peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if parent is not None:
+                parent.peak = max(parent.peak, frame.peak)
+            event['peak_bytes'] = frame.peak - frame.base
+        if owner is not None:
+            count, seconds = owner.substages.get(name, (0, 0.0))
+            owner.substages[name] = (count + 1, seconds + event['seconds'])
+        else:
+            if frame.substages:
+                event['substages'] = {k: {'count': c, 'seconds': s} for k, (c, s) in frame.substages.items()}
+            event.update(phase='end', max_rss=max_rss())
+            _emit(event)
+
+
+class EventLog:
+    """Hook that keeps the end events of one thread, by default the one it
+    was created on."""
+
+    def __init__(self, thread=None):
+        self.thread = threading.get_ident() if thread is None else thread
+        self.events = []
+
+    def __call__(self, event):
+        if event['phase'] == 'end' and event['thread'] == self.thread:
+            self.events.append(event)
+
+    def totals(self):
+        return stage_totals(self.events)
+
+    def peak_rss(self):
+        return peak_rss(self.events)
+
+
+def stage_totals(events):
+    """Total seconds per stage name over end ``events``, folded substages
+    included, in order of first completion."""
+    totals = {}
+    for event in events:
+        totals[event['stage']] = totals.get(event['stage'], 0.0) + event['seconds']
+        for name, sub in event.get('substages', {}).items():
+            totals[name] = totals.get(name, 0.0) + sub['seconds']
+    return totals
+
+
+def peak_rss(events):
+    """Highest peak RSS reported by ``events``, or None."""
+    peaks = [e['max_rss'] for e in events if e.get('max_rss') is not None]
+    return max(peaks) if peaks else None
+
+
+class JsonLinesHook:
+    """Hook that appends end events to ``path`` as JSON lines, with
+    ``extra`` fields added to every line."""
+
+    def __init__(self, path, **extra):
+        self.path = path
+        self.extra = extra
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        if event['phase'] != 'end':
+            return
+        line = json.dumps(dict(event, **self.extra), default=str) + '\n'
+        with self.lock:
+            if self.path == '-':
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(line)
+
+
+class StageProfiler:
+    """Hook that runs cProfile while any of ``stages`` (all if None) is
+    open, keeping one profile per stage name.
+
+    cProfile sees only the thread that starts it, so stages on other
+    threads are skipped while a profile is running.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = stages
+        self.profiles = {}
+        self._running = None
+
+    def __call__(self, event):
+        name = event['stage']
+        if self.stages is not None and name not in self.stages:
+            return
+        key = (name, event['thread'], event['depth'])
+        if event['phase'] == 'start' and self._running is None:
+            self.profiles.setdefault(name, cProfile.Profile()).enable()
+            self._running = key
+        elif event['phase'] == 'end' and self._running == key:
+            self.profiles[name].disable()
+            self._running = None
+
+    def stats(self, name):
+        """``pstats.Stats`` of everything run in stage ``name``."""
+        return pstats.Stats(self.profiles[name])
@@ -0,0 +1,52 @@
+"""Level-of-detail display meshes.
+
+Million-triangle lattices are too heavy to rotate smoothly with smooth
+shading and shadows, so the viewport shows the finest level that fits a
+triangle budget while the exact mesh is kept for export. Lower levels come
+from coarser field evaluations, which are far cheaper than decimating the
+exact mesh and reproduce the same surface.
+"""
+import math
+
+from field import PREVIEW_DTYPE
+
+# Default maximum number of triangles sent to the viewport.
+DISPLAY_BUDGET = 1_000_000
+
+
+def fitted_resolution(res, n_cells, budget):
+    """Grid resolution whose mesh should have about ``budget`` triangles,
+    given that ``res`` produced ``n_cells``; triangles grow with res^2."""
+    if n_cells <= budget:
+        return res
+    return max(2, int(res * math.sqrt(budget / n_cells)))
+
+
+class LevelOfDetail:
+    """Meshes of one parameter set at several resolutions."""
+
+    def __init__(self, exact):
+        self.exact = exact
+        self.levels = [exact]
+
+    def add(self, mesh):
+        self.levels.append(mesh)
+        self.levels.sort(key=lambda m: m.n_cells)
+
+    def select(self, budget=DISPLAY_BUDGET):
+        """Return the finest level within ``budget`` triangles, or the
+        coarsest level if none fits."""
+        fitting = [m for m in self.levels if m.n_cells <= budget]
+        return fitting[-1] if fitting else self.levels[0]
+
+
+def build_levels(gyroid_generator, params, exact, budget=DISPLAY_BUDGET, previews=()):
+    """Collect the exact mesh, any preview meshes and, when the exact mesh is
+    over budget, a level evaluated at the resolution that fits it."""
+    lod = LevelOfDetail(exact)
+    for mesh in previews:
+        lod.add(mesh)
+    res = fitted_resolution(params['res'], exact.n_cells, budget)
+    if res < params['res'] and lod.select(budget).n_cells < budget / 2:
+        lod.add(gyroid_generator.generate(dict(params, res=res, dtype=PREVIEW_DTYPE)))
+    return lod
@@ -1,9 +1,10 @@
+import argparse
 import sys
 
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QPalette, QColor
 from PyQt5.QtCore import Qt
-import qdarkstyle
+from cache import CachedGenerator, DiskCache, MemoryCache
 from gui import GyroidGeneratorGUI
 from gyroid_generator import GyroidGenerator
 from visualization import GyroidVisualization
@@ -29,16 +30,30 @@ def set_dark_theme(app):
     app.setPalette(dark_palette)
     app.setStyleSheet("QToolTip { color: #ffffff; background-color: #2a82da; border: 1px solid white; }")
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Interactive gyroid generator.")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Also keep generated meshes on disk here, across sessions.")
+    parser.add_argument('--cache-policy', choices=['lru', 'lfu'], default='lru',
+                        help="Which in-memory cache entry to evict first when it is full.")
+    # Anything else is left for Qt
+    return parser.parse_known_args(argv)
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    args, qt_argv = parse_args(sys.argv[1:])
+    app = QApplication(sys.argv[:1] + qt_argv)
     
-    # Uncomment the following line to use QDarkStyle
+    # Uncomment the following lines to use QDarkStyle
+    # import qdarkstyle
     # app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
     
     # Or use the custom dark theme
     set_dark_theme(app)
     
-    gyroid_generator = GyroidGenerator()
+    # Repeated parameter sets are served from an in-memory cache, and from
+    # disk with --cache-dir
+    disk = DiskCache(args.cache_dir) if args.cache_dir else None
+    gyroid_generator = CachedGenerator(GyroidGenerator(), MemoryCache(policy=args.cache_policy), disk)
     visualization = GyroidVisualization()
     
     window = GyroidGeneratorGUI(gyroid_generator, visualization)
@@ -0,0 +1,214 @@
+"""Contouring of sampled fields and stitching of piecewise meshes."""
+import numpy as np
+import pyvista as pv
+from vtkmodules.util.numpy_support import numpy_to_vtk
+from vtkmodules.vtkCommonDataModel import vtkImageData
+from vtkmodules.vtkFiltersCore import vtkFlyingEdges3D
+
+from field import field_dtype, field_mode
+from instrument import stage
+from surfaces import is_radial, surface_kernel
+
+# Field value outside the domain when capping solids. It is far above any
+# field value, so caps lie within rounding error of the domain boundary.
+CAP_VALUE = 1e6
+
+
+def grid_spacing(params):
+    """Distance between neighbouring grid samples along each axis."""
+    return np.array([params[p] / (params['res'] - 1) for p in ('a', 'b', 'c')])
+
+
+def contour_index_space(values, offset=None):
+    """Contour ``values`` on a unit-spaced image grid with flying edges.
+
+    Output vertices are in grid-index units, with ``values[0, 0, 0]`` at the
+    integer index ``offset``. The block is placed by its extent rather than
+    its origin, so vertices on a plane shared by two separately contoured
+    blocks are computed from the same absolute indices and values and
+    coincide exactly, wherever the blocks start. The filter is driven
+    directly, as pyvista's wrapper costs more than contouring a small block.
+    """
+    offset = offset or (0, 0, 0)
+    grid = vtkImageData()
+    grid.SetExtent(*(int(i) for o, n in zip(offset, values.shape) for i in (o, o + n - 1)))
+    scalars = numpy_to_vtk(values.ravel('F'), deep=False)
+    scalars.SetName("vol")
+    grid.GetPointData().SetScalars(scalars)
+    contour = vtkFlyingEdges3D()
+    contour.SetInputData(grid)
+    contour.SetValue(0, 0.0)
+    contour.ComputeNormalsOff()
+    contour.ComputeGradientsOff()
+    contour.ComputeScalarsOff()
+    contour.Update()
+    return pv.wrap(contour.GetOutput())
+
+
+def to_shape_space(params, points, spacing=None):
+    """Map grid-index points to the shape's coordinates.
+
+    Cartesian and diamond grids are a plain scaling; radial grids are
+    scaled to ``(r_aux, phi, z)`` and mapped to cylindrical positions. The
+    result has the dtype given by ``params['dtype']``.
+    """
+    if spacing is None:
+        spacing = grid_spacing(params)
+    dtype = field_dtype(params)
+    points = points.astype(dtype) * np.asarray(spacing, dtype=dtype)
+    if is_radial(params):
+        points = map_radial(params, points)
+    return points
+
+
+def contour_field(params, values, offset=None):
+    """Extract the zero isosurface of ``values`` sampled on the shape's grid.
+
+    ``offset`` is the grid index of ``values[0, 0, 0]`` when the values
+    cover only a block of the grid. Only the output vertices are mapped to
+    physical coordinates; the grid itself is never materialised as
+    coordinate arrays.
+    """
+    with stage('contour'):
+        points, faces = contour_index(params, values, offset)
+        return pv.PolyData.from_regular_faces(to_shape_space(params, points), faces)
+
+
+def contour_index(params, values, offset=None):
+    """Contour ``values`` as ``contour_field`` does, but return the vertices
+    in grid-index units together with the triangles, for callers that
+    stitch blocks before mapping them."""
+    if field_mode(params) != 'surface':
+        return contour_solid_index(params, values, offset)
+    mesh = contour_index_space(values, offset)
+    return np.asarray(mesh.points), triangles(mesh)
+
+
+def closes_ring(params):
+    """Whether a radial field repeats exactly around the ring, so that its
+    phi = 0 and phi = 2*pi planes can be joined."""
+    if not is_radial(params):
+        return False
+    periods = params['phi_scale'] * params['cell_radius']
+    return surface_kernel(params).periodic(1) and abs(periods - round(periods)) < 1e-9
+
+
+def contour_solid(params, values, offset=None):
+    """Contour the boundary of the solid region ``values <= 0`` as a closed mesh.
+
+    Sides of ``values`` that lie on the boundary of the ``res^3`` grid are
+    padded with ``CAP_VALUE``, so a single contour pass also produces the
+    caps where the solid meets the domain boundary. Around a closed radial
+    ring the two phi ends are joined instead of capped. Sides inside the
+    grid are left open, to be welded to the neighbouring block.
+    """
+    points, faces = contour_solid_index(params, values, offset)
+    return pv.PolyData.from_regular_faces(to_shape_space(params, points), faces)
+
+
+def contour_solid_index(params, values, offset=None):
+    """``contour_solid`` with the vertices left in grid-index units.
+
+    Around a closed ring the phi = 2*pi plane is mapped onto phi = 0. A
+    block that does not span the whole ring is not capped at its phi ends;
+    its values on the phi = 2*pi plane must then equal those on phi = 0
+    for its vertices there to weld to the block at the other end.
+    """
+    res = params['res']
+    offset = (0, 0, 0) if offset is None else offset
+    ring = closes_ring(params)
+    whole_ring = ring and offset[1] == 0 and values.shape[1] == res
+    pad = []
+    for axis in range(3):
+        if axis == 1 and ring:
+            pad.append((0, 0))
+        else:
+            pad.append((int(offset[axis] == 0), int(offset[axis] + values.shape[axis] == res)))
+    padded = np.full([n + lo + hi for n, (lo, hi) in zip(values.shape, pad)], CAP_VALUE,
+                     dtype=values.dtype, order='F')
+    padded[tuple(slice(lo, lo + n) for n, (lo, _) in zip(values.shape, pad))] = values
+    if whole_ring:
+        padded[:, -1] = padded[:, 0]
+
+    mesh = contour_index_space(padded, tuple(int(o) - lo for o, (lo, _) in zip(offset, pad)))
+    if not mesh.n_points:
+        return np.empty((0, 3), np.float32), np.empty((0, 3), np.int64)
+    # Cap vertices sit a rounding error outside the grid. Clamping them onto
+    # it would merge distinct vertices along the edges of the box.
+    points = np.array(mesh.points)
+    faces = triangles(mesh)
+    if ring:
+        points[points[:, 1] == res - 1, 1] = 0
+        points, faces = weld_exact(points, faces, np.flatnonzero(points[:, 1] == 0))
+    return points, faces
+
+
+def map_radial(params, points):
+    """Map ``(r_aux, phi, z)`` parameter-space points to cylindrical positions."""
+    ky = 2 * np.pi / params['b']
+    r = (params['r2'] - params['r1']) / params['a'] * points[:, 0] + params['r1']
+    out = np.empty_like(points)
+    out[:, 0] = r * np.cos(points[:, 1] * ky)
+    out[:, 1] = r * np.sin(points[:, 1] * ky)
+    out[:, 2] = points[:, 2]
+    return out
+
+
+def triangles(mesh):
+    """Return the ``(n, 3)`` vertex index array of an all-triangle PolyData."""
+    return mesh.faces.reshape((-1, 4))[:, 1:]
+
+
+def weld_exact(points, faces, candidates=None):
+    """Merge bit-identical vertices, keeping first-occurrence order.
+
+    Pieces contoured on grids that share a boundary plane interpolate the
+    same edges from the same values, so their seam vertices coincide exactly.
+    ``candidates`` optionally restricts the comparison to the given sorted
+    vertex indices, e.g. the vertices lying on seam planes. Triangles that
+    collapse when their vertices merge, which happens where the field is
+    exactly zero at a sample, are dropped.
+    """
+    points = np.ascontiguousarray(points)
+    if candidates is None:
+        candidates = np.arange(len(points))
+    if len(candidates) == 0:
+        return points, faces
+    keys = points[candidates].view(np.dtype((np.void, points.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    target = np.arange(len(points))
+    target[candidates] = candidates[first[inverse.ravel()]]
+    keep = target == np.arange(len(points))
+    index = np.cumsum(keep) - 1
+    faces = index[target][faces]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    return points[keep], faces
+
+
+def seam_planes(params, starts):
+    """z coordinates of the grid planes with the given indices, rounded
+    exactly as ``to_shape_space`` rounds them."""
+    dtype = field_dtype(params)
+    return np.asarray(starts, dtype=dtype) * grid_spacing(params)[2].astype(dtype)
+
+
+def merge_arrays(pieces, seams=None):
+    """Concatenate ``(points, faces)`` pieces and weld their seam vertices.
+
+    ``seams`` optionally lists the z coordinates of the planes shared by
+    the pieces; only vertices on those planes are then compared.
+    """
+    pieces = [(p, f) for p, f in pieces if len(p)]
+    if not pieces:
+        return pv.PolyData()
+    offsets = np.cumsum([0] + [len(p) for p, _ in pieces[:-1]])
+    points = np.concatenate([p for p, _ in pieces])
+    faces = np.concatenate([f + off for (_, f), off in zip(pieces, offsets)])
+    candidates = None if seams is None else np.flatnonzero(np.isin(points[:, 2], seams))
+    points, faces = weld_exact(points, faces, candidates)
+    return pv.PolyData.from_regular_faces(points, faces)
+
+
+def merge_meshes(meshes, seams=None):
+    """Concatenate triangle meshes and weld their shared seam vertices."""
+    return merge_arrays(((m.points, triangles(m)) for m in meshes), seams)
@@ -0,0 +1,51 @@
+"""Default generation parameters shared by the GUI and the command line."""
+from surfaces import GYROID, SURFACES, get_surface
+
+# Parameters of each coordinate system
+COORDINATE_PARAMS = {
+    'radial': ['res', 'a', 'b', 'c', 'r1', 'r2', 'phi_scale', 'cell_radius', 'cell_height'],
+    'cartesian': ['res', 'a', 'b', 'c', 'density'],
+}
+
+DEFAULT_PARAMS = {
+    'res': 80, 'a': 24, 'b': 24, 'c': 10, 'r1': 12, 'r2': 0,
+    'phi_scale': 8, 'cell_radius': 2, 'cell_height': 3, 'density': 1,
+    'expression': GYROID, 'mode': 'surface', 'thickness': 0.3
+}
+
+# Slider ranges of the parameters in live-preview mode
+PARAM_RANGES = {
+    'res': (10, 400), 'a': (1, 100), 'b': (1, 100), 'c': (1, 100), 'r1': (0, 50), 'r2': (0, 50),
+    'phi_scale': (1, 32), 'cell_radius': (0.25, 10), 'cell_height': (0.25, 10), 'density': (0.25, 8),
+    'thickness': (0, 1.5)
+}
+
+# Values of the radial-only parameters for shapes that do not use them
+CARTESIAN_DEFAULTS = {'r1': 0, 'r2': 0, 'phi_scale': 1, 'cell_radius': 1, 'cell_height': 1}
+
+
+def shape_names():
+    """Names of the registered surfaces."""
+    return list(SURFACES)
+
+
+def shape_params(shape):
+    """Parameters the user sets for ``shape``."""
+    surface = get_surface(shape)
+    names = list(COORDINATE_PARAMS[surface.coordinates]) + ['thickness']
+    if surface.expression is None:
+        names.append('expression')
+    return names
+
+
+def complete_params(params):
+    """Return a full parameter set for ``params['shape']``, filling in
+    defaults for anything not given."""
+    shape = params.get('shape', 'radial')
+    full = dict(DEFAULT_PARAMS)
+    if get_surface(shape).coordinates == 'cartesian':
+        full.update(CARTESIAN_DEFAULTS)
+    full.update(params)
+    full['shape'] = shape
+    full['res'] = int(full['res'])
+    return full
@@ -0,0 +1,123 @@
+"""Periodicity-aware generation: contour one unit cell and replicate it.
+
+Surfaces in cartesian coordinates repeat ``density`` times along each axis
+and the radial field repeats ``phi_scale * cell_radius`` times in phi and
+``cell_height`` times in z. When a period count is a whole number the domain
+is an exact lattice of cells along that axis, so a single cell is evaluated
+and contoured and the lattice is built from translated copies of its mesh.
+
+Cells are contoured and replicated in grid-index space, where every copy is
+an exact integer translation; the lattice is mapped to the shape's
+coordinates afterwards.
+"""
+import numpy as np
+import pyvista as pv
+
+from field import evaluate_field, field_mode
+from meshing import contour_index_space, to_shape_space, triangles, weld_exact
+from surfaces import is_radial, surface_kernel
+
+
+def _whole(n):
+    return int(round(n)) if n >= 1 and abs(n - round(n)) < 1e-9 else 1
+
+
+def cell_counts(params):
+    """Return how many whole periods of the field fit along each axis."""
+    if is_radial(params):
+        # The radial mask breaks periodicity along r_aux.
+        counts = 1, _whole(params['phi_scale'] * params['cell_radius']), _whole(params['cell_height'])
+    else:
+        counts = (_whole(params.get('density', 1)),) * 3
+    # Formulas with non-integer frequencies do not repeat every 2*pi.
+    kernel = surface_kernel(params)
+    return tuple(n if kernel.periodic(axis) else 1 for axis, n in enumerate(counts))
+
+
+def cell_mesh(params, counts, cell_res=None):
+    """Contour one unit cell.
+
+    Returns the cell's points in grid-index units, its triangles, the number
+    of grid intervals along each axis and the grid spacing.
+    """
+    res = params['res']
+    sizes = [params[p] / n for p, n in zip(('a', 'b', 'c'), counts)]
+    steps = np.array([cell_res or max(1, round((res - 1) / n)) for n in counts])
+    axes = [np.linspace(0, size, m + 1) for size, m in zip(sizes, steps)]
+
+    values = evaluate_field(params, axes=axes)
+    # Make opposite faces of the cell bit-identical so that neighbouring
+    # copies contour their shared face the same way.
+    for axis, n in enumerate(counts):
+        if n > 1:
+            first = [slice(None)] * 3
+            last = [slice(None)] * 3
+            first[axis], last[axis] = 0, -1
+            values[tuple(last)] = values[tuple(first)]
+
+    mesh = contour_index_space(values)
+    return np.array(mesh.points), np.array(triangles(mesh)), steps, np.array(sizes) / steps
+
+
+def _face_partners(points, sizes, axis):
+    """Map each vertex on the cell's upper face along ``axis`` to the vertex
+    at the same position on the lower face, or -1 where there is none."""
+    other = [a for a in range(3) if a != axis]
+    key_type = np.dtype((np.void, points.dtype.itemsize * 2))
+    lower = np.flatnonzero(points[:, axis] == 0)
+    upper = np.flatnonzero(points[:, axis] == sizes[axis])
+    lower_keys = np.ascontiguousarray(points[lower][:, other]).view(key_type).ravel()
+    upper_keys = np.ascontiguousarray(points[upper][:, other]).view(key_type).ravel()
+
+    partner = np.full(len(points), -1)
+    if len(lower) and len(upper):
+        order = np.argsort(lower_keys)
+        pos = np.minimum(np.searchsorted(lower_keys[order], upper_keys), len(lower) - 1)
+        found = lower_keys[order][pos] == upper_keys
+        partner[upper[found]] = lower[order[pos[found]]]
+    return partner
+
+
+def replicate(points, faces, sizes, counts):
+    """Tile a cell mesh ``counts`` times, sharing vertices across cell faces.
+
+    Seam vertices are matched once on the single cell, then every copy's
+    upper-face vertex is redirected to the lower-face vertex of the next copy,
+    so the lattice is welded in linear time without sorting its vertices.
+    """
+    points, faces = weld_exact(points, faces)
+    n = len(points)
+    copies = np.array(list(np.ndindex(*counts)))
+    vertex = np.tile(np.arange(n), len(copies))
+    copy = np.repeat(copies, n, axis=0)
+    for axis in range(3):
+        if counts[axis] > 1:
+            partner = _face_partners(points, sizes, axis)
+            move = (partner[vertex] >= 0) & (copy[:, axis] < counts[axis] - 1)
+            vertex[move] = partner[vertex[move]]
+            copy[move, axis] += 1
+
+    # Every replicated vertex now refers to its canonical (copy, vertex) id.
+    canonical = np.ravel_multi_index(copy.T, counts) * n + vertex
+    keep = np.zeros(len(canonical), dtype=bool)
+    keep[canonical] = True
+    index = np.cumsum(keep) - 1
+
+    kept = np.flatnonzero(keep)
+    out = points[kept % n] + copies[kept // n] * sizes
+    faces = (faces + (np.arange(len(copies)) * n)[:, None, None]).reshape(-1, 3)
+    return out, index[canonical[faces]]
+
+
+def generate_periodic(params, cell_res=None):
+    """Generate the lattice from a single contoured unit cell.
+
+    ``cell_res`` sets the number of grid intervals per cell along each axis;
+    by default the cell is sampled at the spacing of the full ``res`` grid.
+    """
+    if field_mode(params) != 'surface':
+        raise ValueError("Periodic replication only supports mode 'surface'; caps break the lattice symmetry")
+    counts = cell_counts(params)
+    points, faces, steps, spacing = cell_mesh(params, counts, cell_res)
+    points, faces = replicate(points, faces, steps, counts)
+    return pv.PolyData.from_regular_faces(to_shape_space(params, points, spacing), faces)
@@ -0,0 +1,350 @@
+"""Mesh post-processing on flat point and face arrays.
+
+Each step takes ``(points, faces)`` arrays and returns new arrays plus a
+dict describing what it did; ``run_steps`` chains them and collects a
+report. Per-face work (areas, edges, quadrics) is done a chunk of faces at
+a time, so the steps never build per-face temporaries for the whole mesh.
+
+Steps:
+
+* ``weld`` merges coincident vertices, e.g. duplicated seam vertices.
+* ``clean`` merges coincident vertices, then removes degenerate and
+  duplicate faces and unused vertices, without opening closed meshes.
+* ``smooth`` applies Taubin (lambda|mu) smoothing, which unlike plain
+  Laplacian smoothing does not shrink the mesh.
+* ``decimate`` simplifies by quadric edge collapse: edges are collapsed
+  cheapest first to the point that minimises the summed squared distance
+  to the planes of the faces around them, keeping the mesh manifold.
+"""
+import numpy as np
+
+from instrument import stage
+
+# Faces processed per chunk.
+CHUNK_FACES = 1 << 20
+
+DEFAULT_STEPS = ('weld', 'clean')
+# Least cosine between a face's normals before and after a collapse.
+MIN_FACE_COSINE = 0.2
+# Share of the collapsible edges, cheapest first, considered per pass.
+PASS_FRACTION = 0.25
+
+
+def _void_keys(array):
+    array = np.ascontiguousarray(array)
+    return array.view(np.dtype((np.void, array.dtype.itemsize * array.shape[1]))).ravel()
+
+
+def _chunks(faces, chunk=CHUNK_FACES):
+    for start in range(0, len(faces), chunk):
+        yield start, faces[start:start + chunk]
+
+
+def face_normals(points, faces):
+    """Unnormalised face normals, of length twice the face area."""
+    normals = np.empty((len(faces), 3))
+    for start, block in _chunks(faces):
+        corners = points[block].astype(np.float64)
+        normals[start:start + len(block)] = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    return normals
+
+
+def unique_edges(faces):
+    """Undirected edges of the mesh and how many faces share each."""
+    n = np.int64(faces.max()) + 1 if len(faces) else 1
+    keys = np.concatenate([np.sort(block[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1).astype(np.int64) @ [n, 1]
+                           for _, block in _chunks(faces)]) if len(faces) else np.empty(0, np.int64)
+    keys, counts = np.unique(keys, return_counts=True)
+    return np.column_stack([keys // n, keys % n]), counts
+
+
+def weld(points, faces, tolerance=0.0):
+    """Merge vertices with identical coordinates, or, with a ``tolerance``,
+    vertices falling into the same cell of a grid of that spacing. The
+    first vertex of each group is kept, in first-occurrence order."""
+    if tolerance:
+        keys = np.floor(points / tolerance).astype(np.int64)
+    else:
+        # Adding zero turns -0.0 into 0.0, which otherwise differs bitwise
+        keys = np.asarray(points) + points.dtype.type(0)
+    _, first, inverse = np.unique(_void_keys(keys), return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return points[first[order]], rank[inverse.ravel()][faces], {'merged': len(points) - len(first)}
+
+
+def clean(points, faces):
+    """Merge coincident vertices, then remove faces with repeated vertices,
+    faces over the same vertices as another, and vertices no face uses.
+
+    Only faces whose removal leaves every edge shared by as many faces, mod
+    2, are removed, so no closed mesh is opened: a face with a repeated
+    vertex covers its one real edge twice, and faces over the same
+    vertices go in pairs, keeping one of an odd group. Faces of zero area
+    over three distinct points, e.g. along the contour of a field that is
+    zero at a grid point, close the mesh like any other and are kept.
+    """
+    points, faces, info = weld(points, faces)
+    ordered = np.sort(faces, axis=1)
+    degenerate = (ordered[:, 0] == ordered[:, 1]) | (ordered[:, 1] == ordered[:, 2])
+    kept = np.flatnonzero(~degenerate)
+    _, first, counts = np.unique(_void_keys(ordered[kept]), return_index=True, return_counts=True)
+    kept = kept[np.sort(first[counts % 2 == 1])]
+    faces = faces[kept]
+
+    used = np.zeros(len(points), dtype=bool)
+    used[faces] = True
+    index = np.cumsum(used) - 1
+    info.update(degenerate=int(degenerate.sum()), duplicate=int((~degenerate).sum() - len(kept)),
+                unused=int(len(points) - used.sum()))
+    return points[used], index[faces], info
+
+
+def taubin_smooth(points, faces, iterations=10, lam=0.5, mu=-0.53, fix_boundary=True):
+    """Taubin smoothing with uniform weights.
+
+    Vertices on open boundary edges stay in place when ``fix_boundary`` is
+    set, so meshes cut by the domain keep their outline.
+    """
+    edges, counts = unique_edges(faces)
+    n = len(points)
+    # Neighbour lists in CSR form: the neighbours of vertex v are
+    # neighbours[starts[v]:starts[v] + degree[v]].
+    source = np.concatenate([edges[:, 0], edges[:, 1]])
+    order = np.argsort(source, kind='stable')
+    neighbours = np.concatenate([edges[:, 1], edges[:, 0]])[order]
+    degree = np.bincount(source, minlength=n)
+    starts = np.concatenate(([0], np.cumsum(degree)[:-1]))
+    connected = np.flatnonzero(degree)
+    movable = degree[connected] > 0
+    if fix_boundary:
+        fixed = np.zeros(n, dtype=bool)
+        fixed[edges[counts == 1].ravel()] = True
+        movable &= ~fixed[connected]
+    vertices = connected[movable]
+    weights = 1 / degree[vertices, None]
+
+    original = points
+    points = points.astype(np.float64)
+    for _ in range(int(iterations)):
+        for factor in (lam, mu):
+            mean = np.add.reduceat(np.take(points, neighbours, axis=0), starts[connected])[movable] * weights
+            points[vertices] += factor * (mean - points[vertices])
+    displacement = np.linalg.norm(points - original, axis=1)
+    info = {'iterations': int(iterations), 'fixed': int(n - len(vertices)),
+            'max_displacement': float(displacement.max()) if n else 0.0}
+    return points.astype(original.dtype), faces, info
+
+
+def _quadric_terms(points, faces):
+    # The 10 distinct entries of each face's area-weighted plane quadric.
+    normals = face_normals(points, faces)
+    length = np.linalg.norm(normals, axis=1)
+    unit = np.divide(normals, length[:, None], out=np.zeros_like(normals), where=length[:, None] > 0)
+    plane = np.column_stack([unit, -np.einsum('ij,ij->i', unit, points[faces[:, 0]])])
+    area = length / 2
+    rows, cols = np.triu_indices(4)
+    return plane[:, rows] * plane[:, cols] * area[:, None], rows, cols
+
+
+def vertex_quadrics(points, faces):
+    """Sum of the plane quadrics of the faces around each vertex, as
+    symmetric 4x4 matrices."""
+    n = len(points)
+    quadrics = np.zeros((n, 4, 4))
+    for _, block in _chunks(faces):
+        terms, rows, cols = _quadric_terms(points, block)
+        for corner in range(3):
+            for k, (r, c) in enumerate(zip(rows, cols)):
+                quadrics[:, r, c] += np.bincount(block[:, corner], weights=terms[:, k], minlength=n)
+    quadrics[:, 1:, 0] = quadrics[:, 0, 1:]
+    quadrics[:, 2:, 1] = quadrics[:, 1, 2:]
+    quadrics[:, 3, 2] = quadrics[:, 2, 3]
+    return quadrics
+
+
+def _ranges(starts, counts):
+    # Owner and position of every element of the ranges
+    # [starts[i], starts[i] + counts[i]), concatenated.
+    owner = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, starts[owner] + offsets
+
+
+def _collapse_targets(points, quadrics, edges):
+    # Point minimising the summed quadric of each edge, and its cost.
+    # Regularised towards the midpoint, as on flat and straight patches
+    # the quadric is singular.
+    q = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+    a = q[:, :3, :3]
+    eps = 1e-3 * np.trace(a, axis1=1, axis2=2) / 3 + 1e-12
+    midpoint = (points[edges[:, 0]] + points[edges[:, 1]]) / 2
+    b = eps[:, None] * midpoint - q[:, :3, 3]
+    target = np.linalg.solve(a + eps[:, None, None] * np.eye(3), b[:, :, None])[:, :, 0]
+    h = np.column_stack([target, np.ones(len(target))])
+    return target, np.einsum('ij,ijk,ik->i', h, q, h)
+
+
+def _independent(edges, rank, faces, n):
+    # Edges whose rank is the lowest among all edges touching the faces
+    # around either endpoint. No face touches two of them, so they can be
+    # collapsed at once as if one after the other.
+    none = np.iinfo(np.int64).max
+    vertex_min = np.full(n, none)
+    np.minimum.at(vertex_min, edges[:, 0], rank)
+    np.minimum.at(vertex_min, edges[:, 1], rank)
+    face_min = np.minimum(np.minimum(vertex_min[faces[:, 0]], vertex_min[faces[:, 1]]), vertex_min[faces[:, 2]])
+    ring_min = np.full(n, none)
+    np.minimum.at(ring_min, faces.ravel(), np.repeat(face_min, 3))
+    return (ring_min[edges[:, 0]] == rank) & (ring_min[edges[:, 1]] == rank)
+
+
+def _collapsible(points, faces, edges, targets, starts, valence, incident):
+    # Whether collapsing each edge to its target keeps the mesh manifold
+    # and does not fold any face over.
+    n = len(points)
+    ends = np.concatenate([edges[:, 0], edges[:, 1]])
+    owner, position = _ranges(starts[ends], valence[ends])
+    owner %= len(edges)
+    ring = faces[incident[position]]
+    u, v = edges[owner, 0], edges[owner, 1]
+    has_u = np.any(ring == u[:, None], axis=1)
+    has_v = np.any(ring == v[:, None], axis=1)
+
+    # Link condition: the endpoints share exactly the two vertices opposite
+    # the edge, and those keep at least three faces after the collapse.
+    others = np.where((ring == u[:, None]) | (ring == v[:, None]), -1, ring)
+    keys = (np.repeat(owner, 3).astype(np.int64) * n + others.ravel())[others.ravel() >= 0]
+    side = np.repeat(has_u & ~has_v, 3)[others.ravel() >= 0]
+    common = np.intersect1d(np.unique(keys[side]), np.unique(keys[~side]))
+    shared = np.bincount(common // n, minlength=len(edges))
+    opposite = np.where(has_u & has_v, others.max(axis=1), -1)
+    thin = np.zeros(len(edges), dtype=bool)
+    thin[owner[(opposite >= 0) & (valence[np.maximum(opposite, 0)] < 4)]] = True
+    ok = (shared == 2) & ~thin
+
+    # Faces that survive the collapse must not turn over
+    moved = ~(has_u & has_v)
+    corners = points[ring[moved]].astype(np.float64)
+    before = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    endpoint = ((ring[moved] == u[moved, None]) | (ring[moved] == v[moved, None]))[:, :, None]
+    corners = np.where(endpoint, targets[owner[moved]][:, None, :], corners)
+    after = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    cosine = np.einsum('ij,ij->i', before, after)
+    cosine /= np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1) + 1e-300
+    folded = np.zeros(len(edges), dtype=bool)
+    folded[owner[moved][cosine < MIN_FACE_COSINE]] = True
+    return ok & ~folded
+
+
+def decimate(points, faces, target=0.5, max_passes=100):
+    """Simplify to ``target`` times the face count by quadric edge
+    collapse.
+
+    Each pass collapses a batch of cheap edges whose neighbourhoods do not
+    overlap, each to the point minimising the summed quadrics of its
+    endpoints. Batches are built in rounds: the edges cheapest among their
+    neighbours are checked and the valid ones taken, until no edge in the
+    cheapest ``PASS_FRACTION`` is left. A collapse is skipped if it breaks
+    the link condition or folds a face over, and vertices on open or
+    non-manifold edges stay put, so manifold and watertight meshes stay
+    so. Stops early if no edge can be collapsed.
+    """
+    n_faces = len(faces)
+    wanted = int(np.ceil(target * n_faces))
+    n = len(points)
+    quadrics = vertex_quadrics(points, faces)
+    positions = points.astype(np.float64)
+    passes = collapsed = 0
+    while len(faces) > wanted and passes < max_passes:
+        passes += 1
+        edges, counts = unique_edges(faces)
+        fixed = np.zeros(n, dtype=bool)
+        fixed[edges[counts != 2].ravel()] = True
+        edges = edges[~fixed[edges].any(axis=1)]
+        if not len(edges):
+            break
+        targets, cost = _collapse_targets(positions, quadrics, edges)
+        order = np.argsort(cost, kind='stable')[:max(1, int(PASS_FRACTION * len(edges)))]
+        edges, targets = edges[order], targets[order]
+        rank = np.arange(len(edges))
+
+        incident = np.argsort(faces.ravel(), kind='stable') // 3
+        valence = np.bincount(faces.ravel(), minlength=n)
+        starts = np.cumsum(valence) - valence
+        open_edges = np.ones(len(edges), dtype=bool)
+        busy = np.zeros(n, dtype=bool)
+        chosen = []
+        while open_edges.any():
+            candidates = np.flatnonzero(open_edges)
+            picked = candidates[_independent(edges[candidates], rank[candidates], faces, n)]
+            open_edges[picked] = False
+            picked = picked[_collapsible(positions, faces, edges[picked], targets[picked], starts, valence, incident)]
+            chosen.append(picked)
+            # The faces around the collapsed edges are taken; edges touching
+            # any of them must wait for the next pass
+            ends = np.zeros(n, dtype=bool)
+            ends[edges[picked].ravel()] = True
+            busy[faces[ends[faces[:, 0]] | ends[faces[:, 1]] | ends[faces[:, 2]]].ravel()] = True
+            open_edges &= ~(busy[edges[:, 0]] | busy[edges[:, 1]])
+        chosen = np.concatenate(chosen)
+        # Each collapse removes two faces; keep the cheapest on the last
+        # pass, as edges are indexed in order of cost
+        chosen = np.sort(chosen)[:(len(faces) - wanted + 1) // 2]
+        if not len(chosen):
+            break
+
+        u, v = edges[chosen, 0], edges[chosen, 1]
+        positions[u] = targets[chosen]
+        quadrics[u] += quadrics[v]
+        remap = np.arange(n)
+        remap[v] = u
+        faces = remap[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+        collapsed += len(chosen)
+
+    points, faces, _ = clean(positions.astype(points.dtype), faces)
+    return points, faces, {'passes': passes, 'collapsed': collapsed, 'ratio': len(faces) / n_faces}
+
+
+STEPS = {'weld': weld, 'clean': clean, 'smooth': taubin_smooth, 'decimate': decimate}
+
+
+def run_steps(points, faces, steps=DEFAULT_STEPS):
+    """Run post-processing steps in order.
+
+    Each step is a name from ``STEPS`` or a ``(name, kwargs)`` pair.
+    Returns the processed points and faces and a report with one dict per
+    step holding its vertex and face counts, timing and step details.
+    """
+    points = np.asarray(points)
+    faces = np.asarray(faces)
+    report = []
+    for step in steps:
+        name, kwargs = (step, {}) if isinstance(step, str) else step
+        if name not in STEPS:
+            raise ValueError(f"Unknown post-processing step: {name}")
+        n_points, n_faces = len(points), len(faces)
+        with stage('postprocess', step=name) as event:
+            if len(faces):
+                points, faces, info = STEPS[name](points, faces, **kwargs)
+            else:
+                info = {}
+        report.append(dict(step=name, seconds=event['seconds'],
+                           points=[n_points, len(points)], faces=[n_faces, len(faces)], **info))
+    return points, faces, report
+
+
+def parse_steps(text):
+    """Parse steps written as ``name[:key=value...]``, comma-separated,
+    e.g. ``'weld,clean,smooth:iterations=20,decimate:target=0.4'``."""
+    steps = []
+    for item in filter(None, (s.strip() for s in text.split(','))):
+        name, *options = item.split(':')
+        kwargs = {}
+        for option in options:
+            key, _, value = option.partition('=')
+            kwargs[key] = float(value)
+        steps.append((name, kwargs))
+    return steps
@@ -0,0 +1,160 @@
+"""Narrow-band evaluation that only refines blocks near the isosurface.
+
+A coarse pass bounds the field over every block of the grid by interval
+arithmetic on the per-axis factor tables: each separable term's range over
+a block is the product of its factors' ranges along the block's extent on
+each axis. Blocks whose bound excludes zero, or which lie entirely inside
+the radial mask, cannot contain the surface and are skipped. The fine pass
+evaluates only the remaining active blocks, so the evaluation work scales
+with the surface area rather than the volume. Only the active blocks are
+contoured too.
+"""
+import numpy as np
+
+import pyvista as pv
+
+from field import axis_phases, evaluate_field, field_mode, grid_axes, radial_mask, separable_terms
+from instrument import stage
+from meshing import closes_ring, contour_field, contour_index, to_shape_space, weld_exact
+from surfaces import is_radial
+
+# Grid intervals along each edge of a block.
+BLOCK_EDGE = 24
+# Share of active blocks above which the dense path is used.
+SPARSE_MAX_ACTIVE = 0.3
+
+
+def block_edges(res, size):
+    """Start indices of the blocks along one axis, plus the final index."""
+    return np.append(np.arange(0, res - 1, size), res - 1)
+
+
+def _factor_ranges(factor, edges, count):
+    # Per-block min/max of a 1-D table over the samples of each block,
+    # boundary samples included; None stands for the constant 1.
+    if factor is None:
+        return np.ones(count), np.ones(count)
+    lo = np.array([factor[e0:e1 + 1].min() for e0, e1 in zip(edges[:-1], edges[1:])])
+    hi = np.array([factor[e0:e1 + 1].max() for e0, e1 in zip(edges[:-1], edges[1:])])
+    return lo, hi
+
+
+def _interval_product(a, b):
+    products = (a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1])
+    return np.minimum.reduce(products), np.maximum.reduce(products)
+
+
+def field_bounds(params, edges):
+    """Bound the field over every block; returns ``(lo, hi)`` block arrays."""
+    axes = grid_axes(params)
+    terms = separable_terms(params, *axis_phases(params, *axes))
+    shape = tuple(len(e) - 1 for e in edges)
+    lo = np.zeros(shape)
+    hi = np.zeros(shape)
+    for term in terms:
+        bound = None
+        for axis, factor in enumerate(term):
+            r = _factor_ranges(factor, edges[axis], shape[axis])
+            view = [None] * 3
+            view[axis] = slice(None)
+            r = (r[0][tuple(view)], r[1][tuple(view)])
+            bound = r if bound is None else _interval_product(bound, r)
+        lo = lo + bound[0]
+        hi = hi + bound[1]
+
+    if field_mode(params) == 'sheet':
+        # Bound |f| - thickness
+        low = np.where((lo <= 0) & (hi >= 0), 0, np.minimum(np.abs(lo), np.abs(hi)))
+        high = np.maximum(np.abs(lo), np.abs(hi))
+        lo, hi = low - params['thickness'], high - params['thickness']
+
+    if is_radial(params):
+        masked = radial_mask(params, axes[0])
+        for b, (e0, e1) in enumerate(zip(edges[0][:-1], edges[0][1:])):
+            block = masked[e0:e1 + 1]
+            if block.all():
+                lo[b], hi[b] = 1, 1
+            elif block.any():
+                lo[b] = np.minimum(lo[b], 1)
+                hi[b] = np.maximum(hi[b], 1)
+    return lo, hi
+
+
+def active_blocks(params, block_edge=BLOCK_EDGE):
+    """Bound the field per block.
+
+    Returns the per-axis block edges, a boolean array of the blocks that may
+    contain the zero isosurface, and the sign of the field in every other
+    block. For solids, blocks on the domain boundary that may hold solid
+    are active too, since they need caps.
+    """
+    edges = [block_edges(params['res'], block_edge)] * 3
+    lo, hi = field_bounds(params, edges)
+    active = (lo <= 0) & (hi >= 0)
+    if field_mode(params) != 'surface':
+        boundary = np.zeros(active.shape, dtype=bool)
+        for axis in range(3):
+            index = [slice(None)] * 3
+            index[axis] = [0, -1]
+            boundary[tuple(index)] = True
+        active |= boundary & (lo <= 0)
+    return edges, active, np.where(hi < 0, -1.0, 1.0)
+
+
+def _runs(flags):
+    # (start, stop) index pairs of consecutive True entries.
+    padded = np.concatenate(([False], flags, [False])).astype(np.int8)
+    change = np.flatnonzero(np.diff(padded))
+    return zip(change[::2], change[1::2])
+
+
+def generate_sparse(params, block_edge=BLOCK_EDGE):
+    """Evaluate and contour only the blocks that may contain the surface.
+
+    Each run of active blocks along x is evaluated and contoured on its
+    own, so both the evaluation and the contouring work scale with the
+    number of active blocks. The pieces are welded on the block planes they
+    share, in grid-index units where their seam vertices coincide exactly,
+    and then mapped to the shape's coordinates.
+
+    Every piece costs a call into VTK, so where more than
+    ``SPARSE_MAX_ACTIVE`` of the blocks are active, as for most periodic
+    surfaces, the dense path is faster and is used instead. Sparse
+    evaluation pays off for fields with large regions away from the
+    surface, e.g. the part of a radial grid cut away by the mask.
+    """
+    edges, active, _ = active_blocks(params, block_edge)
+    if active.mean() > SPARSE_MAX_ACTIVE:
+        return contour_field(params, evaluate_field(params))
+
+    u, v, w = grid_axes(params)
+    ring = field_mode(params) != 'surface' and closes_ring(params)
+    if ring:
+        # Pieces at the phi = 2*pi end must see exactly the values at phi = 0
+        v = v.copy()
+        v[-1] = v[0]
+    ex, ey, ez = edges
+    pieces = []
+    for k in range(len(ez) - 1):
+        z0, z1 = ez[k], ez[k + 1] + 1
+        for j in range(len(ey) - 1):
+            j0, j1 = ey[j], ey[j + 1] + 1
+            for r0, r1 in _runs(active[:, j, k]):
+                i0, i1 = ex[r0], ex[r1] + 1
+                values = evaluate_field(params, axes=(u[i0:i1], v[j0:j1], w[z0:z1]))
+                with stage('contour'):
+                    pieces.append(contour_index(params, values, (i0, j0, z0)))
+    pieces = [(p, f) for p, f in pieces if len(p)]
+    if not pieces:
+        return pv.PolyData()
+
+    offsets = np.cumsum([0] + [len(p) for p, _ in pieces[:-1]])
+    points = np.concatenate([p for p, _ in pieces])
+    faces = np.concatenate([f + off for (_, f), off in zip(pieces, offsets)])
+    seams = np.zeros(len(points), dtype=bool)
+    for axis, e in enumerate(edges):
+        seams |= np.isin(points[:, axis], e[1:-1])
+    if ring:
+        seams |= points[:, 1] == 0
+    points, faces = weld_exact(points, faces, np.flatnonzero(seams))
+    return pv.PolyData.from_regular_faces(to_shape_space(params, points), faces)
@@ -1,44 +1,121 @@
 import numpy as np
 import pyvista as pv
 
+from instrument import stage
+
 class GyroidVisualization:
+    def __init__(self):
+        # Persistent scene: actors are created on the first render and then
+        # updated in place.
+        self.plotter = None
+        self.display_mesh = None
+        self.mesh_actor = None
+        self.box = None
+        self.plane = None
+        self.text_actor = None
+        self.bounds = None
+        self.lookup_table = pv.LookupTable(cmap='viridis')
+
     def render(self, plotter, gyroid_mesh, gyroid_colors):
+        with stage('render', n_cells=gyroid_mesh.n_cells):
+            self._render(plotter, gyroid_mesh)
+
+    def _render(self, plotter, gyroid_mesh):
+        if plotter is not self.plotter or self.mesh_actor is None:
+            self._build_scene(plotter, gyroid_mesh)
+            return
+
+        # Swap the new points and polys into the existing mesh actor
+        self.display_mesh.shallow_copy(gyroid_mesh)
+        # The copy drops the point normals add_mesh computed for smooth shading
+        self.display_mesh.compute_normals(cell_normals=False, inplace=True)
+        self._set_elevation(gyroid_mesh)
+
+        bounds = gyroid_mesh.bounds
+        self.box.copy_from(pv.Box(bounds))
+        self.plane.copy_from(self._ground_plane(gyroid_mesh))
+        self.text_actor.SetText(2, self._info(gyroid_mesh))
+
+        # Keep the user's view unless the model changed size noticeably
+        if not np.allclose(bounds, self.bounds, rtol=0.05, atol=1e-3 * np.ptp(bounds)):
+            plotter.reset_camera()
+        self.bounds = bounds
+        plotter.render()
+
+    def _build_scene(self, plotter, gyroid_mesh):
         plotter.clear()
-        
+        self.plotter = plotter
+        self.display_mesh = pv.PolyData()
+        self.display_mesh.shallow_copy(gyroid_mesh)
+        self.display_mesh["elevation"] = gyroid_mesh.points[:, -1]
+
         # Add the gyroid mesh with improved appearance
-        plotter.add_mesh(gyroid_mesh, 
-                         scalars=gyroid_mesh.points[:, -1], 
-                         show_scalar_bar=False,
-                         smooth_shading=True,
-                         specular=0.5,
-                         cmap='viridis')
-        
+        self.mesh_actor = plotter.add_mesh(self.display_mesh,
+                                           scalars="elevation",
+                                           show_scalar_bar=False,
+                                           smooth_shading=True,
+                                           specular=0.5,
+                                           cmap='viridis')
+        self.mesh_actor.mapper.lookup_table = self.lookup_table
+        self._set_elevation(gyroid_mesh)
+
         # Add a semi-transparent bounding box
         bounds = gyroid_mesh.bounds
-        box = pv.Box(bounds)
-        plotter.add_mesh(box, style='wireframe', color='gray', opacity=0.5)
-        
+        self.box = pv.Box(bounds)
+        plotter.add_mesh(self.box, style='wireframe', color='gray', opacity=0.5)
+
         # Add axes with labels
         plotter.add_axes(xlabel='X', ylabel='Y', zlabel='Z', line_width=2)
-        
+
         # Add text displaying mesh information
-        info = f"Vertices: {gyroid_mesh.n_points}\nFaces: {gyroid_mesh.n_cells}"
-        plotter.add_text(info, position='upper_left', font_size=10)
-        
+        self.text_actor = plotter.add_text(self._info(gyroid_mesh), position='upper_left', font_size=10)
+
         # Set camera position for a good initial view
         plotter.camera_position = 'iso'
         plotter.reset_camera()
-        
+        self.bounds = bounds
+
         # Enable shadows for better depth perception
         plotter.enable_shadows()
-        
+
         # Add a simple ground plane
+        self.plane = self._ground_plane(gyroid_mesh)
+        plotter.add_mesh(self.plane, color='lightgray', opacity=0.5)
+
+    def _set_elevation(self, gyroid_mesh):
+        # Color by height; only the scalar range of the lookup table changes
+        z = gyroid_mesh.points[:, -1]
+        self.display_mesh.point_data.set_array(z, "elevation")
+        self.display_mesh.set_active_scalars("elevation")
+        if len(z):
+            self.mesh_actor.mapper.scalar_range = (z.min(), z.max())
+
+    def _ground_plane(self, gyroid_mesh):
+        bounds = gyroid_mesh.bounds
         center = gyroid_mesh.center
         normal = [0, 0, 1]
         origin = [center[0], center[1], bounds[4]]  # Use the bottom of the bounding box for Z
-        plotter.add_mesh(pv.Plane(center=origin, direction=normal, i_size=bounds[1]-bounds[0], j_size=bounds[3]-bounds[2]),
-                         color='lightgray', opacity=0.5)
+        return pv.Plane(center=origin, direction=normal, i_size=bounds[1]-bounds[0], j_size=bounds[3]-bounds[2])
+
+    def _info(self, gyroid_mesh):
+        return f"Vertices: {gyroid_mesh.n_points}\nFaces: {gyroid_mesh.n_cells}"
+
+    def update_colors(self, plotter, new_colors=None, cmap=None):
+        # Method to update colors without regenerating the entire visualization:
+        # either a named colormap or a gradient between the given RGB colors
+        if cmap is not None:
+            lookup_table = pv.LookupTable(cmap=cmap)
+        else:
+            ramp = np.linspace(0, 1, 256)[:, None]
+            start, end = np.asarray(new_colors[0]), np.asarray(new_colors[-1])
+            values = np.full((256, 4), 255, dtype=np.uint8)
+            values[:, :3] = np.round(255 * (start + ramp * (end - start)))
+            lookup_table = pv.LookupTable()
+            lookup_table.values = values
+        self.lookup_table = lookup_table
 
-    def update_colors(self, plotter, gyroid_mesh, new_colors):
-        # Method to update colors without regenerating the entire visualization
-        plotter.update_scalars(new_colors, mesh=gyroid_mesh)
+        if self.mesh_actor is not None and plotter is self.plotter:
+            scalar_range = self.mesh_actor.mapper.scalar_range
+            self.mesh_actor.mapper.lookup_table = lookup_table
+            self.mesh_actor.mapper.scalar_range = scalar_range
+            plotter.render()
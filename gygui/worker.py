@@ -0,0 +1,94 @@
+"""Background generation for the GUI with progress, cancellation and
+progressive refinement."""
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from field import PREVIEW_DTYPE
+from instrument import EventLog, hooked
+from lod import DISPLAY_BUDGET, build_levels
+
+# Resolution of the first, instant preview.
+PREVIEW_RES = 24
+# Number of slabs the final mesh is split into for progress reporting.
+PROGRESS_STEPS = 20
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+def preview_resolutions(res, start=PREVIEW_RES):
+    """Resolutions to generate in turn, doubling from ``start`` up to ``res``.
+
+    Previews stop at half of ``res`` so that they cost a fraction of the
+    full mesh, which matters more as a preview cannot be cancelled partway.
+    """
+    levels = []
+    level = start
+    while level * 2 <= res:
+        levels.append(level)
+        level *= 2
+    return levels + [res]
+
+
+class GenerationWorker(QObject):
+    """Generates a mesh on a worker thread.
+
+    Every signal carries the job id so the GUI can ignore results from jobs
+    it has since replaced. ``timings`` carries the ``EventLog`` of the
+    stages the job ran and is emitted just before ``completed``.
+    """
+    preview = pyqtSignal(int, object)
+    progress = pyqtSignal(int, int)
+    timings = pyqtSignal(int, object)
+    completed = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    done = pyqtSignal(int)
+
+    def __init__(self, job_id, gyroid_generator, params, display_budget=DISPLAY_BUDGET):
+        super().__init__()
+        self.job_id = job_id
+        self.gyroid_generator = gyroid_generator
+        self.params = params
+        self.display_budget = display_budget
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def check_cancelled(self):
+        if self._cancelled:
+            raise GenerationCancelled()
+
+    def report_progress(self, done, total):
+        self.check_cancelled()
+        self.progress.emit(self.job_id, int(100 * done / total))
+
+    def run(self):
+        log = EventLog()
+        try:
+            with hooked(log):
+                self.generate(log)
+        except GenerationCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(self.job_id, str(e))
+        finally:
+            self.done.emit(self.job_id)
+
+    def generate(self, log):
+        previews = []
+        levels = preview_resolutions(self.params['res'])
+        for res in levels[:-1]:
+            mesh = self.gyroid_generator.generate(dict(self.params, res=res, dtype=PREVIEW_DTYPE))
+            self.check_cancelled()
+            previews.append(mesh)
+            self.preview.emit(self.job_id, mesh)
+
+        slab_size = max(1, (self.params['res'] - 1) // PROGRESS_STEPS)
+        mesh = self.gyroid_generator.generate_streaming(self.params, slab_size, self.report_progress)
+        self.check_cancelled()
+        # The previews double as display levels for the exact mesh
+        lod = build_levels(self.gyroid_generator, self.params, mesh, self.display_budget, previews)
+        self.check_cancelled()
+        self.timings.emit(self.job_id, log)
+        self.completed.emit(self.job_id, lod)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from gyroid_generator import GyroidGenerator
+from meshing import triangles
+from parameters import complete_params
+from postprocess import clean, parse_steps, run_steps, unique_edges
+
+
+def n_open_edges(faces):
+    return int(np.sum(unique_edges(faces)[1] == 1))
+
+
+@pytest.fixture(scope='module', params=[{'shape': 'diamond', 'res': 60, 'mode': 'solid'},
+                                        {'shape': 'radial', 'res': 60, 'mode': 'sheet'},
+                                        {'shape': 'cartesian', 'res': 48, 'mode': 'sheet'}])
+def closed_mesh(request):
+    mesh = GyroidGenerator().generate(complete_params(request.param))
+    return np.asarray(mesh.points), triangles(mesh)
+
+
+@pytest.mark.parametrize('steps', ['clean', 'weld,clean', 'decimate:target=0.5', 'weld,clean,decimate:target=0.3'])
+def test_steps_keep_closed_meshes_closed(closed_mesh, steps):
+    points, faces = closed_mesh
+    assert n_open_edges(faces) == 0
+    points, faces, _ = run_steps(points, faces, parse_steps(steps))
+    assert len(faces) and n_open_edges(faces) == 0
+
+
+def test_clean_keeps_zero_area_faces():
+    # A tetrahedron with one side split at the midpoint of an edge, closed
+    # by a zero-area sliver, plus a copy of vertex 0, a degenerate face and
+    # a face given three times
+    points = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [0.5, 0, 0], [0, 0, 0]], dtype=float)
+    faces = np.array([[0, 2, 1], [1, 2, 3], [5, 3, 2], [0, 4, 3], [4, 1, 3], [0, 1, 4],
+                      [1, 3, 1], [1, 2, 3], [1, 2, 3]])
+    points, faces, info = clean(points, faces)
+    assert (info['merged'], info['degenerate'], info['duplicate']) == (1, 1, 2)
+    assert len(points) == 5 and len(faces) == 6
+    assert n_open_edges(faces) == 0
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from surfaces import compile_expression
+
+
+def test_expands_to_separable_terms():
+    kernel = compile_expression('cos(x)*cos(y)*cos(z) - sin(x)*sin(y)*sin(z)')
+    assert sorted(coef for coef, _ in kernel.terms) == [-1.0, 1.0]
+    assert all(len(kernel.factors[axis]) == 2 for axis in range(3))
+
+
+def test_shares_repeated_factors():
+    kernel = compile_expression('sin(x)*sin(y) + sin(x)*cos(y)')
+    assert kernel.factors[0] == [(('sin', 1.0, 0.0),)]
+
+
+def test_folds_constant_trig_terms():
+    kernel = compile_expression('cos(0)*sin(2*x + pi/2)')
+    assert kernel.terms == [(1.0, (0, None, None))]
+    assert kernel.axis_tables(0, np.array([0.0]))[0] == pytest.approx([1.0])
+
+
+@pytest.mark.parametrize('expression', ['sin(x) - sin(x)', '0', '2*cos(pi)', 'sin(x)*0 + 1'])
+def test_rejects_constant_formulas(expression):
+    with pytest.raises(ValueError, match='does not depend'):
+        compile_expression(expression)
+
+
+@pytest.mark.parametrize('expression', ['sin(x*y)', 'sin(x + y)', 'exp(x)', 'sin(x', 'x**-1'])
+def test_rejects_unsupported_formulas(expression):
+    with pytest.raises(ValueError):
+        compile_expression(expression)